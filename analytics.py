@@ -0,0 +1,98 @@
+import dash_bootstrap_components as dbc
+import numpy as np
+from dash import html
+
+from dataset import DECILE_COLUMNS, map_categories
+from figures import DECILE_ORDER
+from regions import ALL, REGIONS, region_slices
+
+"""
+Summary statistics of the areas on the map: the number of areas in each
+decile of every domain, cross-tabulations of the combined decile against each
+domain and the share of areas without a score (NA, coded 0 or -1) by country.
+They are computed with bincount over the decile codes once for each loaded
+dataset and region, and the panel showing them is kept too, so that showing
+it again is a lookup.
+"""
+
+# Deciles 1 to 10, then every other value (the NA codes)
+NA = len(DECILE_ORDER)
+SUMMARY_COLUMNS = DECILE_ORDER + ['NA']
+
+
+def decile_index(values):
+    """Position of each value in SUMMARY_COLUMNS."""
+    categories = values.cat.categories.astype(str)
+    lookup = np.array([DECILE_ORDER.index(c) if c in DECILE_ORDER else NA for c in categories], dtype=np.int64)
+    return map_categories(values, lookup, NA)
+
+
+class Summary:
+
+    def __init__(self, areas, countries):
+        n = len(SUMMARY_COLUMNS)
+        index = {domain: decile_index(areas[domain]) for domain in DECILE_COLUMNS}
+        self.total = len(areas)
+
+        # Areas in each decile, a row per domain
+        self.counts = {domain: np.bincount(index[domain], minlength=n) for domain in DECILE_COLUMNS}
+
+        # Combined decile (rows) against the decile of each domain (columns)
+        combined = index['pp_dec_combined']
+        self.crosstabs = {domain: np.bincount(combined * n + index[domain], minlength=n * n).reshape(n, n)
+                          for domain in DECILE_COLUMNS}
+
+        # Share of the areas of each country with no score for each domain
+        country_codes = [c for c in REGIONS if c!=ALL]
+        country = np.full(len(countries), len(country_codes))
+        for i, code in enumerate(country_codes):
+            country[countries==code] = i
+        areas_per_country = np.bincount(country, minlength=len(country_codes) + 1)
+        self.countries = [c for c, total in zip(country_codes, areas_per_country) if total]
+        self.na_share = {}
+        for domain in DECILE_COLUMNS:
+            na = np.bincount(country, weights=index[domain]==NA, minlength=len(country_codes) + 1)
+            self.na_share[domain] = {c: na[i] / areas_per_country[i]
+                                     for i, c in enumerate(country_codes) if areas_per_country[i]}
+
+
+def summary(dataset, region=ALL):
+    def build(dataset):
+        slices = region_slices(dataset)
+        areas, _ = slices.frames(dataset, region)
+        countries = slices.area_countries if region==ALL else slices.area_countries[slices.areas[region]]
+        return Summary(areas, countries)
+    return dataset.derived(('summary', region), build)
+
+
+def _table(header, rows):
+    return dbc.Table([html.Thead(html.Tr([html.Th(h) for h in header])),
+                      html.Tbody([html.Tr([html.Th(row[0])] + [html.Td(v) for v in row[1:]]) for row in rows])],
+                     bordered=True, size='sm', responsive=True, style={'fontSize': 'small'})
+
+
+def _panel(summary, domain, labels):
+    if not summary.total:
+        return html.Small('There are no areas in this region.')
+    return html.Div([
+        html.H6('Areas in each decile ({:,} areas)'.format(summary.total)),
+        _table(['Domain'] + SUMMARY_COLUMNS,
+               [[labels.get(d, d)] + ['{:,}'.format(c) for c in summary.counts[d]] for d in labels]),
+        html.H6('Priority Places Index decile (rows) against {} decile (columns)'.format(labels.get(domain, domain))),
+        _table([''] + SUMMARY_COLUMNS,
+               [[name] + ['{:,}'.format(c) for c in row]
+                for name, row in zip(SUMMARY_COLUMNS, summary.crosstabs[domain]) if row.any()]),
+        html.H6('Share of areas with no score (NA)'),
+        _table(['Domain'] + [REGIONS[c] for c in summary.countries],
+               [[labels.get(d, d)] + ['{:.1%}'.format(summary.na_share[d][c]) for c in summary.countries]
+                for d in labels]),
+    ])
+
+
+def analytics_panel(dataset, region, domain, labels):
+    """
+    Summary tables for the areas in the region, with the cross-tabulation for
+    domain. labels maps each domain to the name shown for it.
+    """
+    return dataset.derived(('analytics_panel', region, domain),
+                           lambda d: _panel(summary(d, region), domain, labels))
@@ -0,0 +1,143 @@
+from flask import Blueprint, Response, jsonify, request
+
+from changes import CHANGE_ORDER
+from dataset import DECILE_COLUMNS, current_dataset
+from export import FORMATS, export_stream, parquet_available, selected_rows
+from nearby import DEFAULT_K, DEFAULT_RADIUS_KM, nearby_records
+from regions import ALL, REGIONS
+
+"""
+JSON endpoints served by the Flask server alongside the explorer.
+"""
+
+MAX_K = 50
+MAX_RADIUS_KM = 50
+MAX_QUERIES = 50000
+
+api = Blueprint('api', __name__, url_prefix='/api')
+
+
+class BadRequest(ValueError):
+    pass
+
+
+@api.errorhandler(BadRequest)
+def bad_request(error):
+    return jsonify({'error': str(error)}), 400
+
+
+def _dataset(values):
+    # Dataset of the release and retail_release given, the default ones if not
+    try:
+        return current_dataset(values.get('release'), values.get('retail_release'))
+    except KeyError as e:
+        raise BadRequest(e.args[0])
+
+
+def _number(value, name, maximum, cast=float):
+    try:
+        value = cast(value)
+    except (TypeError, ValueError):
+        raise BadRequest('{} must be a number'.format(name))
+    if not 0 < value <= maximum:
+        raise BadRequest('{} must be greater than 0 and at most {}'.format(name, maximum))
+    return value
+
+
+@api.route('/nearest', methods=['GET', 'POST'])
+def nearest():
+    """
+    Nearest stores to areas or coordinates.
+
+    GET  /api/nearest?geo_code=E01011229&k=5&radius_km=1
+    GET  /api/nearest?lat=53.80&lon=-1.55
+    POST /api/nearest {"geo_codes": [...], "points": [[lat, lon], ...], "k": 5, "radius_km": 1}
+
+    Each result lists the k nearest stores, the number of stores of each size
+    within radius_km and the distance to the nearest large store. release and
+    retail_release pick the releases of the data, as for /api/export.
+    """
+    if request.method=='POST':
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict):
+            raise BadRequest('Expected a JSON object')
+        geo_codes = body.get('geo_codes', [])
+        points = body.get('points', [])
+        k = body.get('k', DEFAULT_K)
+        radius_km = body.get('radius_km', DEFAULT_RADIUS_KM)
+    else:
+        geo_codes = request.args.getlist('geo_code')
+        points = list(zip(request.args.getlist('lat'), request.args.getlist('lon')))
+        k = request.args.get('k', DEFAULT_K)
+        radius_km = request.args.get('radius_km', DEFAULT_RADIUS_KM)
+
+    k = _number(k, 'k', MAX_K, cast=int)
+    radius_km = _number(radius_km, 'radius_km', MAX_RADIUS_KM)
+    if not isinstance(geo_codes, list) or not isinstance(points, list):
+        raise BadRequest('geo_codes and points must be lists')
+    if len(geo_codes) + len(points) > MAX_QUERIES:
+        raise BadRequest('At most {} queries can be made at once'.format(MAX_QUERIES))
+
+    queries = [{'geo_code': str(code)} for code in geo_codes]
+    for point in points:
+        try:
+            lat, lon = point
+            queries.append({'lat': float(lat), 'lon': float(lon)})
+        except (TypeError, ValueError):
+            raise BadRequest('points must be [lat, lon] pairs')
+
+    results = nearby_records(_dataset(body if request.method=='POST' else request.args), queries, k, radius_km)
+    return jsonify({'k': k, 'radius_km': radius_km, 'results': results})
+
+
+@api.route('/export')
+def export():
+    """
+    Download of the areas on the map.
+
+    GET /api/export?format=csv&domain=pp_dec_combined&decile=1&decile=2&region=E&stores=1
+    GET /api/export?format=csv&domain=pp_dec_combined&compare=Oct2021&change=-1&change=-2
+
+    format is csv, geojson or parquet. Only the areas in region (all of them
+    by default) whose decile for domain is one of the decile values (any by
+    default) are included. With compare, an index release to compare with,
+    only the areas whose change in decile since then is in one of the change
+    groups of the map (any by default) are included. With stores=1, the nearest store to each area and
+    the stores within the default radius are added. release and
+    retail_release pick the releases of the data (the default ones if not
+    given). The file is sent in chunks as it is written.
+    """
+    export_format = request.args.get('format', 'csv')
+    if export_format not in FORMATS:
+        raise BadRequest('format must be one of {}'.format(', '.join(FORMATS)))
+    if export_format=='parquet' and not parquet_available():
+        raise BadRequest('Parquet export is not available on this server')
+    domain = request.args.get('domain', 'pp_dec_combined')
+    if domain not in DECILE_COLUMNS:
+        raise BadRequest('Unknown domain {}'.format(domain))
+    region = request.args.get('region', ALL)
+    if region not in REGIONS:
+        raise BadRequest('Unknown region {}'.format(region))
+    deciles = request.args.getlist('decile') or None
+    changes = request.args.getlist('change') or None
+    unknown = set(changes or ()) - set(CHANGE_ORDER) - {''}
+    if unknown:
+        raise BadRequest('Unknown change {}, expected one of {}'.format(
+            ', '.join(sorted(unknown)), ', '.join(CHANGE_ORDER)))
+    with_stores = request.args.get('stores', '0') not in ('0', 'false', '')
+
+    dataset = _dataset(request.args)
+    other = None
+    if request.args.get('compare'):
+        try:
+            other = current_dataset(request.args['compare'], dataset.releases[1])
+        except KeyError as e:
+            raise BadRequest(e.args[0])
+    elif changes is not None:
+        raise BadRequest('change can only be used with compare')
+    rows = selected_rows(dataset, domain, deciles, region, other, changes)
+    mimetype, extension = FORMATS[export_format]
+    response = Response(export_stream(dataset, rows, export_format, with_stores), mimetype=mimetype)
+    response.headers['Content-Disposition'] = 'attachment; filename=priority_places_{}_{}.{}'.format(
+        domain, region, extension)
+    return response
@@ -1,10 +1,25 @@
-from dash import Dash, dcc, html, Input, Output
+from dash import ClientsideFunction, Dash, dcc, html, ctx, Input, Output, State
+from dash.exceptions import PreventUpdate
 import dash_daq as daq
-import plotly.express as px
 import dash_bootstrap_components as dbc
-import pandas as pd
 import base64
 import os
+import time
+
+import metrics
+from analytics import analytics_panel
+from api import api
+from cache import FigureCache
+from changes import change_groups, decile_change
+from dataset import current_dataset, datasets
+from details import PLACEHOLDER, point_details, row_details
+from figures import (area_view_update, build_change_figure, build_figure, clientside_payload, regroup_update,
+                     retailer_update, tile_map_payload)
+from regions import ALL, REGIONS, region_slices
+from retailer_filter import filter_key, filtered_retailers, retailer_masks
+from search import search_areas
+from tiles import tiles
+from viewport import viewport_figure
 
 def encode_image(image_file):
     encoded = base64.b64encode(open(image_file, 'rb').read())
@@ -12,46 +27,112 @@ def encode_image(image_file):
 
 
 
-df = pd.read_csv('/app/data/priority_places_Oct2022_WGS.csv',
-                    dtype={'pp_dec_domain_supermarket_proximity':'category',
-                        'pp_dec_domain_supermarket_accessibility':'category',
-                        'pp_dec_domain_ecommerce_access':'category',
-                        'pp_dec_domain_socio_demographic':'category',
-                        'pp_dec_domain_nonsupermarket_proximity':'category',
-                        'pp_dec_domain_food_for_families':'category',
-                        'pp_dec_domain_fuel_poverty':'category', 
-                        'pp_dec_combined': 'category'}
-)
+# How the map is sent to the browser: 'incremental' sends the whole figure once
+# and then only partial updates, 'viewport' sends summaries or the points in
+# view as the user pans and zooms, 'clientside' sends the data once and the
+# browser draws the map for each domain itself, 'tiles' draws the map from
+# vector tiles of the points in view (see tiles.py)
+MAP_MODES = ['incremental', 'viewport', 'clientside', 'tiles']
+MAP_MODE = os.getenv('MAP_MODE', 'incremental')
+if MAP_MODE not in MAP_MODES:
+    raise ValueError('Unknown MAP_MODE {!r}, expected one of {}'.format(MAP_MODE, ', '.join(MAP_MODES)))
+
+# The country filter and area search are only available when the server
+# sends the figures
+FILTERS_ENABLED = MAP_MODE=='incremental'
+
+# Releases of the data that can be picked, and compared, with the filters.
+# The release controls are hidden when there is only one of each
+AREAS_RELEASES, RETAILERS_RELEASES = datasets.releases()
+DEFAULT_RELEASES = datasets.default_releases()
+RELEASES_SHOWN = len(AREAS_RELEASES) > 1 or len(RETAILERS_RELEASES) > 1
+
+DOMAIN_OPTIONS = [
+    {"label": "Priority Places for Food Index", "value": "pp_dec_combined"},
+    {"label": "Proximity to supermarket retail facilities", "value": "pp_dec_domain_supermarket_proximity"}, 
+    {"label": "Accessibility to supermarket retail facilties", "value": "pp_dec_domain_supermarket_accessibility"}, 
+    {"label": "Access to online deliveries", "value": "pp_dec_domain_ecommerce_access"}, 
+    {"label": "Proximity to non-supermarket food provision", "value": "pp_dec_domain_nonsupermarket_proximity"},
+    {"label": "Socio-demographic barriers", "value": "pp_dec_domain_socio_demographic"}, 
+    {"label": "Need for family food support", "value": "pp_dec_domain_food_for_families"}, 
+    {"label": "Fuel poverty", "value": "pp_dec_domain_fuel_poverty"}
+]
+
+DOMAIN_LABELS = {option['value']: option['label'] for option in DOMAIN_OPTIONS}
+
+
+def build_map(dataset, kind, *args):
+    if kind=='regroup':
+        return regroup_update(dataset.areas, *args)
+    if kind=='retailers':
+        show_retailers, region, retailer_values, sizes = args
+        return retailer_update(filtered_retailers(dataset, retailer_values, sizes, region), show_retailers,
+                               by_size=True)
+    if kind=='view':
+        return area_view_update(dataset.areas, *args)
+    if kind=='clientside':
+        payload = clientside_payload(dataset.areas, dataset.retailers, [option['value'] for option in DOMAIN_OPTIONS])
+        return dict(payload, version=dataset.version)
+    if kind=='tiles':
+        payload = tile_map_payload(dataset.areas, dataset.retailers, [option['value'] for option in DOMAIN_OPTIONS])
+        return dict(payload, version=dataset.version)
+    domain, show_retailers, region, retailer_values, sizes = args[:5]
+    slices = region_slices(dataset)
+    areas, _ = slices.frames(dataset, region)
+    retailers = filtered_retailers(dataset, retailer_values, sizes, region)
+    center, zoom = slices.view(region)
+    if kind=='change':
+        # Against the index release args[5], args[6] is its version
+        other = current_dataset(args[5], dataset.releases[1])
+        changes = change_groups(decile_change(dataset, other).loc[areas.index, domain])
+        return {'type': 'figure',
+                'figure': build_change_figure(areas, retailers, changes, show_retailers, center=center, zoom=zoom,
+                                              by_size=True)}
+    return {'type': 'figure',
+            'figure': build_figure(areas, retailers, domain, show_retailers, center=center, zoom=zoom, by_size=True)}
+
 
+def release_dataset(release=None, retail_release=None):
+    # Dataset of the releases picked, the default ones if a release is no longer there
+    try:
+        return current_dataset(release, retail_release)
+    except KeyError:
+        return current_dataset()
 
-df['label_domain_supermarket_transport'] = df.loc[:, 'pp_dec_domain_supermarket_accessibility'].replace('0', 'NA')
-df['label_domain_ecommerce_access'] = df.loc[:, 'pp_dec_domain_ecommerce_access'].replace('0', 'NA')
-df['label_domain_fuel_poverty'] = df.loc[:, 'pp_dec_domain_fuel_poverty'].replace('0', 'NA')
 
+def map_labels(kind, *args):
+    # Metric labels for the figures and updates built by build_map
+    return {'update': kind,
+            'domain': args[0] if kind in ('figure', 'change', 'regroup') else '',
+            'retailers': (str(args[1] if kind in ('figure', 'change') else args[0])
+                          if kind in ('figure', 'change', 'retailers') else '')}
 
-retailers = pd.read_csv('/app/data/retail_locations_glxv24_202206.csv')
 
-colormap = ['#0d0887',
-            '#41049d',
-            '#6a00a8',
-            '#8f0da4',
-            '#b12a90',
-            '#c94a79',
-            '#db6a68',
-            '#e58858',
-            '#e8a34a',
-            '#e1bf40']
-        
+# Finished figures for every domain, retailer toggle and retailer filter, and
+# the partial updates between them, rebuilt only when the data files change
+figure_cache = FigureCache(build_map, map_labels,
+                           max_bytes=int(os.getenv('FIGURE_CACHE_MAX_MB', '128')) * 2**20)
+datasets.add_listener(figure_cache.retain)
+
+if os.getenv('FIGURE_CACHE_WARM')=='1':
+    figure_cache.warm(current_dataset(), [('figure', option['value'], show_retailers, ALL, (), ())
+                                          for option in DOMAIN_OPTIONS
+                                          for show_retailers in (False, True)])
+
 
 app = Dash(external_stylesheets=[dbc.themes.BOOTSTRAP])
 app.title = "Priority Places"
 server = app.server
+server.register_blueprint(api)
+server.register_blueprint(tiles)
+metrics.register(server)
 
 # Add google analytics tag if the website hostname environment variable matches
 if os.getenv('WEBSITE_HOSTNAME')=='priority-places-explorer.azurewebsites.net':
     with open('ga.html','r') as f:
         app.index_string = f.read()
 
+layout_start = time.perf_counter()
 
 app.layout = html.Div(
     style={'height': '100vh', 
@@ -96,19 +177,58 @@ app.layout = html.Div(
             children=[
                 dcc.Dropdown(
                     id='domain', 
-                    options=[
-                        {"label": "Priority Places for Food Index", "value": "pp_dec_combined"},
-                        {"label": "Proximity to supermarket retail facilities", "value": "pp_dec_domain_supermarket_proximity"}, 
-                        {"label": "Accessibility to supermarket retail facilties", "value": "pp_dec_domain_supermarket_accessibility"}, 
-                        {"label": "Access to online deliveries", "value": "pp_dec_domain_ecommerce_access"}, 
-                        {"label": "Proximity to non-supermarket food provision", "value": "pp_dec_domain_nonsupermarket_proximity"},
-                        {"label": "Socio-demographic barriers", "value": "pp_dec_domain_socio_demographic"}, 
-                        {"label": "Need for family food support", "value": "pp_dec_domain_food_for_families"}, 
-                        {"label": "Fuel poverty", "value": "pp_dec_domain_fuel_poverty"}
-                    ],
+                    options=DOMAIN_OPTIONS,
                     value='pp_dec_combined',
                     multi=False,
                 ),
+                # Country filter and search for an area by code or name
+                *([dbc.Row([
+                    dbc.Col(
+                        dcc.Dropdown(
+                            id='region', 
+                            options=[{'label': label, 'value': value} for value, label in REGIONS.items()],
+                            value=ALL,
+                            clearable=False,
+                        ),
+                        width=3
+                    ),
+                    dbc.Col(
+                        dcc.Dropdown(
+                            id='search', 
+                            options=[],
+                            placeholder='Search for an area by code or name',
+                        ),
+                    )
+                ], style={'marginTop': 10}),
+                # Releases of the index and retail points, and the release to compare with
+                dbc.Row([
+                    dbc.Col(
+                        dcc.Dropdown(
+                            id='release', 
+                            options=[{'label': 'Priority Places Index {}'.format(release), 'value': release}
+                                     for release in AREAS_RELEASES],
+                            value=DEFAULT_RELEASES[0],
+                            clearable=False,
+                        ),
+                    ),
+                    dbc.Col(
+                        dcc.Dropdown(
+                            id='retail_release', 
+                            options=[{'label': 'Geolytix retail points {}'.format(release), 'value': release}
+                                     for release in RETAILERS_RELEASES],
+                            value=DEFAULT_RELEASES[1],
+                            clearable=False,
+                        ),
+                    ),
+                    dbc.Col(
+                        dcc.Dropdown(
+                            id='compare', 
+                            options=[{'label': 'Change since {}'.format(release), 'value': release}
+                                     for release in AREAS_RELEASES],
+                            placeholder='Compare with another index release',
+                        ),
+                    )
+                ], style={'marginTop': 10} if RELEASES_SHOWN else {'display': 'none'})] if FILTERS_ENABLED else []),
                 dbc.Row([
                     dbc.Col(
                         html.Div(
@@ -128,7 +248,27 @@ app.layout = html.Div(
                         ),
                         width='auto'
                     )
-                ])
+                ]),
+                # Retailers and store sizes shown, all of them if none are picked
+                *([dbc.Row([
+                    dbc.Col(
+                        dcc.Dropdown(
+                            id='retailer_filter', 
+                            options=[],
+                            multi=True,
+                            placeholder='All retailers',
+                        ),
+                    ),
+                    dbc.Col(
+                        dcc.Dropdown(
+                            id='size_filter', 
+                            options=[],
+                            multi=True,
+                            placeholder='All store sizes',
+                        ),
+                        width=4
+                    )
+                ], style={'marginTop': 10})] if FILTERS_ENABLED else [])
             ]
         ),
         html.Br(), 
@@ -141,6 +281,29 @@ app.layout = html.Div(
                 figure={}
             ), 
         ),
+        # Download of the areas shown on the map, see export_links in assets/map_updates.js
+        html.Div(
+            html.Small([
+                'Download the areas shown: ',
+                html.A('CSV', id='export_csv', href='/api/export?format=csv'),
+                ' | ',
+                html.A('GeoJSON', id='export_geojson', href='/api/export?format=geojson'),
+            ]),
+            style={'textAlign': 'right'}
+        ),
+        # Details of the area or store under the cursor
+        html.Div(
+            id='details', 
+            children=PLACEHOLDER, 
+            style={'minHeight': 200, 'padding': 10}
+        ),
+        # Updates to the map sent by the server, applied to the figure in the browser
+        dcc.Store(id='figure_update'),
+        dcc.Store(id='figure_version'),
+        # Data for drawing the map in the browser in the clientside map mode
+        dcc.Store(id='map_data'),
+        # Layout and decile colours for drawing the map from vector tiles in the tiles map mode
+        dcc.Store(id='tile_config'),
         html.Div(
             dbc.Accordion(
                 [
@@ -168,7 +331,7 @@ app.layout = html.Div(
                             html.P("""Each point on the map corresponds to a geographic area. Any points coinciding with geographical features such as buildings or residences are reflective of the neighbourhood in which those buildings are a part of and not the building or residence itself."""),
                             html.P("""The map displays deciles of the composite index so that each color represents a different 10% increment of the ranked neighbourhoods. Those neighbourhoods marked with decile 1 are in the top 10% of Priority Places according to the index."""),
                             html.P("""The map initially displays only the top 10% of places according to the composite Priority Places Index. Each domain used to form the index can be explored via the drop down menu. The other deciles can also be added to the map by clicking the coloured points on the legend."""),
-                            html.P("""Hovering over a point also provides the decile scores for each domain."""),
+                            html.P("""Hovering over or clicking on a point shows the decile scores for each domain below the map."""),
                             html.P(
                                 [
                                     """Supermarket and convenience store locations can be added to the map via the toggle switch. These locations are obtained from """, 
@@ -258,6 +421,11 @@ app.layout = html.Div(
                             html.Li("Prepayment meter prevalence, 2017. E,S,W")
                         ], 
                         title='Domain definitions'
+                    ),
+                    dbc.AccordionItem(
+                        # Summary of the areas on the map, filled in by display_analytics
+                        html.Div(id='analytics'),
+                        title='Summary statistics'
                     )
                 ]
             )
@@ -275,75 +443,196 @@ app.layout = html.Div(
     ]
 )
 
+metrics.LOAD_PHASE_SECONDS.labels(phase='layout').set(time.perf_counter() - layout_start)
+
 @app.callback(
-Output("graph", "figure"), 
+Output("details", "children"), 
+Input("graph", "hoverData"), 
+Input("graph", "clickData"), 
+*([Input("search", "value"), State("release", "value"), State("retail_release", "value")] if FILTERS_ENABLED else []), 
+prevent_initial_call=True)
+def display_details(hover_data, click_data, search_row=None, release=None, retail_release=None):
+    trigger = ctx.triggered[0]
+    dataset = release_dataset(release, retail_release)
+    if trigger['prop_id']=='search.value':
+        # The area picked in the search box, with the stores around it
+        details = None if trigger['value'] is None else row_details(dataset, 'areas', trigger['value'],
+                                                                    with_stores=True)
+    else:
+        details = point_details(dataset, trigger['value'],
+                                with_stores=trigger['prop_id']=='graph.clickData')
+    if details is None:
+        raise PreventUpdate
+    return details
+
+
+@app.callback(
+Output("analytics", "children"), 
 Input("domain", "value"), 
-Input("retailer_switch", "on"))
-def display_map(domain, show_retailers):
-
-    fig = px.scatter_mapbox(
-                        df, 
-                        lat='latitude',
-                        lon='longitude', 
-                        color=domain, 
-                        color_discrete_sequence=colormap,
-                        custom_data=['geo_label', 
-                                     'pp_dec_domain_supermarket_proximity',
-                                     'label_domain_supermarket_transport',
-                                     'label_domain_ecommerce_access',
-                                     'pp_dec_domain_socio_demographic',
-                                     'pp_dec_domain_nonsupermarket_proximity',
-                                     'pp_dec_domain_food_for_families',
-                                     'label_domain_fuel_poverty',
-                                     'pp_dec_combined', 
-                                     'geo_code'],
-                        center={'lat': 53.8067, 'lon': -1.5550}, 
-                        category_orders={domain: ['1', '2', '3', '4', '5', '6', '7','8', '9', '10']})
-        
-    fig.update_layout(mapbox_style='carto-positron')
-    fig.update_layout(margin={'r':0, 't':0, 'l':0, 'b':0})
-    fig.update_layout(legend=dict(
-        yanchor="top",
-        y=0.95,
-        xanchor="right",
-        x=0.99, 
-        itemsizing='constant'
-    ))
-    fig.update_layout(legend_title_text='Decile (1 = highest priority)')
-
-
-    fig.update_traces(hovertemplate=(
-                        str('<b>%{customdata[0]} (%{customdata[9]})</b><br>')+\
-                        str('Priority Places Index decile: %{customdata[8]}<br>')+\
-                        str('Proximity to supermarket retail facilities decile: %{customdata[1]}<br>')+\
-                        str('Accessibility to supermarket retail facilties decile: %{customdata[2]}<br>').replace('-1', 'NA')+\
-                        str('Access to online deliveries decile: %{customdata[3]}<br>').replace('-1', 'NA')+\
-                        str('Proximity to non-supermarket food provision decile: %{customdata[5]}<br>')+\
-                        str('Socio-demographic barriers decile: %{customdata[4]}<br>')+\
-                        str('Food support for families decile: %{customdata[6]}<br>')+\
-                        str('Fuel poverty decile: %{customdata[7]}<br>').replace('-1', 'NA')))
-    fig.update_traces(visible='legendonly', selector=(lambda x: int(x.name) > 1))
-    fig.update_traces(visible=False, selector=(lambda x: x.name=='-1'))
-
-    if show_retailers:
-        
-        fig2 = px.scatter_mapbox(retailers, 
-                                    lat='lat_wgs', 
-                                    lon='long_wgs', 
-                                    custom_data=['retailer', 'size_code'],
-        )
-
-        fig.add_trace(fig2.data[0])
-        fig.update_traces(hovertemplate=(
-                                '<b>%{customdata[0]}</b><br>'+\
-                                'Size: %{customdata[1]}<br>'), 
-                        selector=-1)
-
-        fig.data[-1]['marker'] = {'color': '#808080', 'opacity':0.2}
-        fig.update_layout(coloraxis_showscale=False)
-
-    fig.update_geos(fitbounds="locations", visible=True)
-    return fig
+*([Input("region", "value"), Input("release", "value"), Input("retail_release", "value")] if FILTERS_ENABLED else []))
+def display_analytics(domain, region=ALL, release=None, retail_release=None):
+    # Built once for each release, region and domain, then looked up
+    return analytics_panel(release_dataset(release, retail_release), region, domain, DOMAIN_LABELS)
+
+
+if FILTERS_ENABLED:
+
+    @app.callback(
+    Output("search", "options"), 
+    Input("search", "search_value"), 
+    State("region", "value"), 
+    State("release", "value"), 
+    State("retail_release", "value"), 
+    State("search", "value"), 
+    State("search", "options"))
+    def search_options(search_value, region, release, retail_release, value, options):
+        # Keep the options while nothing is typed, so the picked area stays shown
+        if not search_value:
+            raise PreventUpdate
+        dataset = release_dataset(release, retail_release)
+        areas = dataset.areas
+        options = [option for option in options or [] if option['value']==value]
+        for row in search_areas(dataset, search_value, region):
+            if row!=value:
+                options.append({'label': '{} ({})'.format(areas['geo_label'].iloc[row], areas['geo_code'].iloc[row]),
+                                'value': int(row)})
+        return options
+
+
+    @app.callback(
+    Output("retailer_filter", "options"), 
+    Output("size_filter", "options"), 
+    Input("retail_release", "value"), 
+    State("release", "value"))
+    def retailer_filter_options(retail_release, release):
+        return retailer_masks(release_dataset(release, retail_release)).options()
+
+
+if MAP_MODE=='viewport':
+
+    @app.callback(
+    Output("graph", "figure"), 
+    Input("domain", "value"), 
+    Input("retailer_switch", "on"), 
+    Input("graph", "relayoutData"))
+    def display_viewport_map(domain, show_retailers, relayout_data):
+        labels = {'update': 'viewport', 'domain': domain, 'retailers': str(bool(show_retailers))}
+        with metrics.timed(metrics.MAP_CALLBACK_SECONDS, **labels):
+            with metrics.timed(metrics.FIGURE_BUILD_SECONDS, **labels):
+                return viewport_figure(current_dataset(), domain, bool(show_retailers), relayout_data)
+
+elif MAP_MODE=='clientside':
+
+    @app.callback(
+    Output("map_data", "data"), 
+    Input("map_data", "modified_timestamp"), 
+    State("map_data", "data"))
+    def send_map_data(modified_timestamp, map_data):
+        # Sent on page load, and again only if the data has changed since
+        dataset = current_dataset()
+        if map_data is not None and map_data['version']==dataset.version:
+            raise PreventUpdate
+        with metrics.timed(metrics.MAP_CALLBACK_SECONDS, **map_labels('clientside')):
+            return figure_cache.get(dataset, 'clientside')
+
+
+    app.clientside_callback(
+        ClientsideFunction(namespace='map', function_name='build_figure'),
+        Output("graph", "figure"), 
+        Input("domain", "value"), 
+        Input("retailer_switch", "on"), 
+        Input("map_data", "data"))
+
+elif MAP_MODE=='tiles':
+
+    @app.callback(
+    Output("tile_config", "data"), 
+    Input("tile_config", "modified_timestamp"), 
+    State("tile_config", "data"))
+    def send_tile_config(modified_timestamp, tile_config):
+        dataset = current_dataset()
+        if tile_config is not None and tile_config['version']==dataset.version:
+            raise PreventUpdate
+        with metrics.timed(metrics.MAP_CALLBACK_SECONDS, **map_labels('tiles')):
+            return dict(figure_cache.get(dataset, 'tiles'), tile_root=app.get_relative_path('/tiles'))
+
+
+    app.clientside_callback(
+        ClientsideFunction(namespace='map', function_name='tile_figure'),
+        Output("graph", "figure"), 
+        Input("domain", "value"), 
+        Input("retailer_switch", "on"), 
+        Input("tile_config", "data"), 
+        Input("graph", "restyleData"), 
+        State("graph", "figure"))
+
+elif MAP_MODE=='incremental':
+
+    @app.callback(
+    Output("figure_update", "data"), 
+    Output("figure_version", "data"), 
+    Input("domain", "value"), 
+    Input("retailer_switch", "on"), 
+    Input("region", "value"), 
+    Input("search", "value"), 
+    Input("release", "value"), 
+    Input("retail_release", "value"), 
+    Input("compare", "value"), 
+    Input("retailer_filter", "value"), 
+    Input("size_filter", "value"), 
+    State("figure_version", "data"))
+    def display_map(domain, show_retailers, region, search_row, release, retail_release, compare,
+                    retailer_values, sizes, figure_version):
+        # Only the difference to the figure already in the browser is sent when a
+        # single option changes, the whole figure on first load, when the region
+        # or releases change or when the data has changed since it was sent
+        dataset = release_dataset(release, retail_release)
+        other = None
+        if compare:
+            try:
+                other = current_dataset(compare, dataset.releases[1])
+            except KeyError:
+                pass
+        version = dataset.version if other is None else '{}-{}'.format(dataset.version, other.version)
+        filters = (filter_key(retailer_values), filter_key(sizes))
+
+        if figure_version==version and ctx.triggered_id=='search':
+            if search_row is None:
+                raise PreventUpdate
+            args = ('view', search_row)
+        elif figure_version==version and ctx.triggered_id=='domain' and other is None:
+            args = ('regroup', domain)
+        elif figure_version==version and ctx.triggered_id in ('retailer_filter', 'size_filter') and not show_retailers:
+            raise PreventUpdate
+        elif figure_version==version and ctx.triggered_id in ('retailer_switch', 'retailer_filter', 'size_filter'):
+            args = ('retailers', bool(show_retailers), region) + filters
+        elif other is None:
+            args = ('figure', domain, bool(show_retailers), region) + filters
+        else:
+            args = ('change', domain, bool(show_retailers), region) + filters + (compare, other.version)
+
+        with metrics.timed(metrics.MAP_CALLBACK_SECONDS, **map_labels(*args)):
+            # Sent as the cached JSON text, parsed by apply_update in the browser
+            update = figure_cache.get_json(dataset, *args)
+        return update, version
+
+
+    app.clientside_callback(
+        ClientsideFunction(namespace='map', function_name='apply_update'),
+        Output("graph", "figure"), 
+        Input("figure_update", "data"), 
+        State("graph", "figure"))
+
+app.clientside_callback(
+    ClientsideFunction(namespace='map', function_name='export_links'),
+    Output("export_csv", "href"), 
+    Output("export_geojson", "href"), 
+    Input("domain", "value"), 
+    Input("retailer_switch", "on"), 
+    Input("graph", "restyleData"), 
+    Input("graph", "figure"), 
+    *([Input("region", "value"), Input("release", "value"), Input("retail_release", "value"),
+       Input("compare", "value")] if FILTERS_ENABLED else []))
 
 if __name__=="__main__":
     app.run()
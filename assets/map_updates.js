@@ -0,0 +1,259 @@
+// Builds and updates the map figure in the browser. apply_update applies the
+// partial updates sent by the server (see figures.py) to the figure already
+// on the map, so that switching domain or toggling the retailers does not
+// resend every point. build_figure draws the whole map from the data sent
+// once to the browser in the clientside map mode. tile_figure draws the map
+// as mapbox layers of the vector tiles served by tiles.py. export_links
+// points the download links at /api/export for the deciles, or the changes
+// when comparing releases, shown on the map.
+
+function isRetailerTrace(trace) {
+    return trace.meta === 'retailers';
+}
+
+function decodeCode(codes, i) {
+    // Codes are sent as one character per value, or as a list (see encode_codes)
+    return typeof codes === 'string' ? codes.charCodeAt(i) - 48 : codes[i];
+}
+
+function groupTraces(template, groups, codes, points) {
+    // One trace per decile group, in the way plotly express splits the points
+    var traces = groups.map(function(group) {
+        var trace = Object.assign({}, template, {
+            name: group.name,
+            legendgroup: group.name,
+            marker: Object.assign({}, template.marker, {color: group.color}),
+            lat: [],
+            lon: [],
+            customdata: []
+        });
+        delete trace.visible;
+        if (group.visible !== undefined) {
+            trace.visible = group.visible;
+        }
+        return trace;
+    });
+
+    // Rows are visited in order so points keep the order of the original data
+    for (var row = 0; row < points.length; row++) {
+        var point = points[row];
+        if (point === undefined) {
+            continue;
+        }
+        var trace = traces[decodeCode(codes, row)];
+        trace.lat.push(point[0]);
+        trace.lon.push(point[1]);
+        trace.customdata.push(point[2]);
+    }
+
+    return traces.filter(function(trace) { return trace.lat.length > 0; });
+}
+
+function regroupAreas(figure, update) {
+    // Collect every area point already on the map by its row id, which is the
+    // last column of the customdata
+    var areaTraces = figure.data.filter(function(trace) { return !isRetailerTrace(trace); });
+    var points = [];
+    areaTraces.forEach(function(trace) {
+        for (var i = 0; i < trace.lat.length; i++) {
+            var customdata = trace.customdata[i];
+            points[customdata[customdata.length - 1]] = [trace.lat[i], trace.lon[i], customdata];
+        }
+    });
+
+    return groupTraces(areaTraces[0], update.groups, update.codes, points)
+        .concat(figure.data.filter(isRetailerTrace));
+}
+
+function decodePoints(table) {
+    // [lat, lon, customdata] of every row of a column-oriented table
+    var columns = table.customdata.map(function(name) { return table.columns[name]; });
+    var points = new Array(table.lat.length);
+    for (var row = 0; row < table.lat.length; row++) {
+        var customdata = columns.map(function(column) {
+            return column.values ? column.values[row] : column.categories[decodeCode(column.codes, row)];
+        });
+        points[row] = [table.lat[row], table.lon[row], customdata];
+    }
+    return points;
+}
+
+function tileLayer(url, sourcelayer, color, opacity, visible) {
+    return {
+        sourcetype: 'vector',
+        source: [url],
+        sourcelayer: sourcelayer,
+        type: 'circle',
+        circle: {radius: 3},
+        color: color,
+        opacity: opacity,
+        visible: visible
+    };
+}
+
+function withLayers(figure, data, layers) {
+    var mapbox = Object.assign({}, figure.layout.mapbox, {layers: layers});
+    return Object.assign({}, figure, {data: data, layout: Object.assign({}, figure.layout, {mapbox: mapbox})});
+}
+
+function applyRestyle(figure, restyleData) {
+    // Shows or hides the layers of the deciles clicked in the legend. The
+    // legend entries are empty traces in the same order as the layers.
+    var edit = restyleData[0];
+    var indices = restyleData[1];
+    if (!edit || !('visible' in edit) || !indices) {
+        return window.dash_clientside.no_update;
+    }
+    var data = figure.data.slice();
+    var layers = figure.layout.mapbox.layers.slice();
+    indices.forEach(function(index, i) {
+        var visible = Array.isArray(edit.visible) ? edit.visible[i % edit.visible.length] : edit.visible;
+        data[index] = Object.assign({}, data[index], {visible: visible});
+        if (layers[index]) {
+            layers[index] = Object.assign({}, layers[index], {visible: visible === true});
+        }
+    });
+    return withLayers(figure, data, layers);
+}
+
+var decoded = {};
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    map: {
+        apply_update: function(update, figure) {
+            if (!update) {
+                return window.dash_clientside.no_update;
+            }
+            // Updates are sent as the JSON text kept in the server's figure cache
+            if (typeof update === 'string') {
+                update = JSON.parse(update);
+            }
+            if (update.type === 'figure') {
+                return update.figure;
+            }
+            if (!figure || !figure.data) {
+                return window.dash_clientside.no_update;
+            }
+
+            var data;
+            if (update.type === 'regroup') {
+                data = regroupAreas(figure, update);
+            } else if (update.type === 'retailers') {
+                data = figure.data.filter(function(trace) { return !isRetailerTrace(trace); }).concat(update.traces);
+            } else if (update.type === 'view') {
+                var mapbox = Object.assign({}, figure.layout.mapbox, {center: update.center, zoom: update.zoom});
+                return Object.assign({}, figure, {layout: Object.assign({}, figure.layout, {mapbox: mapbox})});
+            }
+            return Object.assign({}, figure, {data: data});
+        },
+
+        build_figure: function(domain, showRetailers, payload) {
+            if (!payload) {
+                return window.dash_clientside.no_update;
+            }
+            // The rows are decoded once for each payload received
+            if (decoded.version !== payload.version) {
+                decoded = {
+                    version: payload.version,
+                    areas: decodePoints(payload.areas),
+                    retailers: decodePoints(payload.retailers)
+                };
+            }
+
+            var domainGroups = payload.areas.domains[domain];
+            var data = groupTraces(payload.areas.trace, domainGroups.groups, domainGroups.codes, decoded.areas);
+            if (showRetailers) {
+                var retailers = decoded.retailers;
+                data.push(Object.assign({}, payload.retailers.trace, {
+                    lat: retailers.map(function(point) { return point[0]; }),
+                    lon: retailers.map(function(point) { return point[1]; }),
+                    customdata: retailers.map(function(point) { return point[2]; })
+                }));
+            }
+            return {data: data, layout: payload.layout};
+        },
+
+        tile_figure: function(domain, showRetailers, config, restyleData, figure) {
+            if (!config) {
+                return window.dash_clientside.no_update;
+            }
+            var triggered = window.dash_clientside.callback_context.triggered.map(function(t) { return t.prop_id; });
+            if (triggered.indexOf('graph.restyleData') !== -1) {
+                if (!restyleData || !figure || !figure.layout || !figure.layout.mapbox) {
+                    return window.dash_clientside.no_update;
+                }
+                return applyRestyle(figure, restyleData);
+            }
+
+            // Tile URLs must be absolute for mapbox, the version makes the
+            // browser fetch new tiles when the data changes
+            var root = window.location.origin + config.tile_root;
+            var query = '/{z}/{x}/{y}.pbf?v=' + config.version;
+            var groups = config.domains[domain];
+            var opacity = config.trace.marker.opacity === undefined ? 1 : config.trace.marker.opacity;
+
+            // Points are drawn by the layers, the traces only make the legend
+            var data = groups.map(function(group) {
+                var trace = Object.assign({}, config.trace, {
+                    name: group.name,
+                    legendgroup: group.name,
+                    marker: Object.assign({}, config.trace.marker, {color: group.color}),
+                    lat: [],
+                    lon: []
+                });
+                delete trace.visible;
+                if (group.visible !== undefined) {
+                    trace.visible = group.visible;
+                }
+                return trace;
+            });
+            var layers = groups.map(function(group) {
+                return tileLayer(root + '/areas/' + domain + query, group.name, group.color, opacity,
+                                 group.visible === undefined);
+            });
+            if (showRetailers) {
+                layers.push(tileLayer(root + '/retailers' + query, 'retailers', config.retailer_marker.color,
+                                      config.retailer_marker.opacity, true));
+            }
+
+            // uirevision keeps the view where the user left it when the domain changes
+            var layout = Object.assign({}, config.layout, {uirevision: 'tiles'});
+            return withLayers({layout: layout}, data, layers);
+        },
+
+        export_links: function(domain, showRetailers, restyleData, figure, region, release, retailRelease, compare) {
+            // Legend clicks change the traces drawn on the page, which the
+            // figure prop does not always follow, so those are read first
+            var graph = document.querySelector('#graph .js-plotly-plot');
+            var data = (graph && graph.data) || (figure && figure.data) || [];
+            var shown = data.filter(function(trace) {
+                return !isRetailerTrace(trace) && trace.visible !== false && trace.visible !== 'legendonly';
+            }).map(function(trace) { return trace.name; });
+
+            var params = ['domain=' + encodeURIComponent(domain), 'region=' + encodeURIComponent(region || 'all')];
+            // When comparing releases the traces are the change groups
+            var param = compare ? 'change=' : 'decile=';
+            if (compare) {
+                params.push('compare=' + encodeURIComponent(compare));
+            }
+            // Until the map is drawn every area is exported
+            if (data.length) {
+                shown.forEach(function(name) { params.push(param + encodeURIComponent(name)); });
+                if (!shown.length) {
+                    params.push(param);
+                }
+            }
+            if (showRetailers) {
+                params.push('stores=1');
+            }
+            if (release) {
+                params.push('release=' + encodeURIComponent(release));
+            }
+            if (retailRelease) {
+                params.push('retail_release=' + encodeURIComponent(retailRelease));
+            }
+            var query = params.join('&');
+            return ['/api/export?format=csv&' + query, '/api/export?format=geojson&' + query];
+        }
+    }
+});
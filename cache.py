@@ -0,0 +1,174 @@
+import gzip
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+import plotly.io as pio
+
+import metrics
+
+"""
+In-memory caches for the explorer. Entries are stored as serialized bytes so
+that the memory they use is known exactly and can be bounded, evicting the
+least recently used entries once the budget is exceeded. Vector tiles can also
+be kept on disk.
+"""
+
+
+class LRUBytesCache:
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= len(self._entries.pop(key))
+            # Entries larger than the whole budget are not worth keeping
+            if len(value) > self.max_bytes:
+                return
+            self._entries[key] = value
+            self.nbytes += len(value)
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= len(evicted)
+
+    def discard(self, predicate):
+        # Remove every entry whose key matches predicate
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                self.nbytes -= len(self._entries.pop(key))
+
+
+class FigureCache:
+    """
+    Finished map figures keyed on (dataset version, *args), held as their
+    serialized JSON. get_json returns the text as it is, to be sent to the
+    browser and parsed there, so a cache hit costs the same however many
+    points the figure has. retain drops the entries of datasets that are no
+    longer loaded. labels(*args) gives the metric labels for the figure built
+    from args.
+    """
+
+    def __init__(self, build, labels, max_bytes=128 * 2**20):
+        self.build = build
+        self.labels = labels
+        self._cache = LRUBytesCache(max_bytes)
+
+    def retain(self, versions):
+        self._cache.discard(lambda key: key[0] not in versions)
+
+    def _payload(self, dataset, *args):
+        key = (dataset.version,) + args
+        payload = self._cache.get(key)
+        metrics.FIGURE_CACHE_REQUESTS.labels(result='miss' if payload is None else 'hit').inc()
+        if payload is None:
+            labels = self.labels(*args)
+            with metrics.timed(metrics.FIGURE_BUILD_SECONDS, **labels):
+                figure = self.build(dataset, *args)
+            with metrics.timed(metrics.FIGURE_SERIALIZE_SECONDS, **labels):
+                payload = pio.to_json(figure, validate=False).encode()
+            self._cache.put(key, payload)
+        return payload
+
+    def get_json(self, dataset, *args):
+        payload = self._payload(dataset, *args)
+        metrics.MAP_RESPONSE_BYTES.labels(**self.labels(*args)).observe(len(payload))
+        return payload.decode()
+
+    def get(self, dataset, *args):
+        # Parsed figure, for the payloads sent once per page load
+        return json.loads(self.get_json(dataset, *args))
+
+    def warm(self, dataset, keys):
+        for args in keys:
+            self._payload(dataset, *args)
+
+
+class TileCache:
+    """
+    Gzip-compressed vector tiles keyed on (dataset version, *key), held in
+    memory up to max_bytes. If directory is given the tiles are also written
+    there, so they are shared between workers and kept across restarts; tiles
+    of older dataset versions are removed from it when the data changes. Tiles
+    of a version built while the data changed are not written, so a removed
+    version directory is not created again by another thread.
+    """
+
+    def __init__(self, build, max_bytes=64 * 2**20, directory=None):
+        self.build = build
+        self.directory = directory
+        self._cache = LRUBytesCache(max_bytes)
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _invalidate(self, version):
+        with self._lock:
+            if version != self._version:
+                self._cache.discard(lambda key: key[0] != version)
+                if self.directory and os.path.isdir(self.directory):
+                    for name in os.listdir(self.directory):
+                        if name != version:
+                            shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+                self._version = version
+
+    def _path(self, key):
+        return os.path.join(self.directory, *[str(part) or '_' for part in key]) + '.pbf.gz'
+
+    def _read(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write(self, key, payload):
+        # Written under a temporary name first so other workers and threads never read part of a tile
+        path = self._path(key)
+        tmp = '{}.{}.{}.tmp'.format(path, os.getpid(), threading.get_ident())
+        with self._lock:
+            if key[0] != self._version:
+                return
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(tmp, 'wb') as f:
+                    f.write(payload)
+                os.replace(tmp, path)
+            except OSError:
+                pass
+
+    def get(self, dataset, layer, *args):
+        self._invalidate(dataset.version)
+        key = (dataset.version, layer) + args
+        payload = self._cache.get(key)
+        result = 'memory'
+        if payload is None and self.directory:
+            payload = self._read(key)
+            result = 'disk'
+        if payload is None:
+            payload = gzip.compress(self.build(dataset, layer, *args), compresslevel=6)
+            result = 'miss'
+            if self.directory:
+                self._write(key, payload)
+        if result!='memory' and key[0]==self._version:
+            self._cache.put(key, payload)
+        metrics.TILE_CACHE_REQUESTS.labels(layer=layer, result=result).inc()
+        return payload
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+from dataset import DECILE_COLUMNS, map_categories
+
+"""
+Change in the deciles of each area between two index releases, for the maps
+comparing them. Areas are matched on geo_code with a single indexer, and the
+change of every domain is worked out on the decile codes, so no rows are
+iterated over.
+"""
+
+# Changes are shown in these groups, from the areas moving most towards
+# decile 1 (highest priority) to those moving most away from it
+CHANGE_ORDER = ['≤ -3', '-2', '-1', 'No change', '+1', '+2', '≥ +3', 'NA']
+
+CHANGE_COLORS = dict(zip(CHANGE_ORDER, ['#b2182b', '#ef8a62', '#fddbc7', '#d9d9d9',
+                                        '#d1e5f0', '#67a9cf', '#2166ac', '#808080']))
+
+
+def decile_numbers(values):
+    """Decile of each value as a float, NaN for the NA codes and missing values."""
+    numbers = pd.to_numeric(pd.Series(values.cat.categories.astype(str)), errors='coerce').to_numpy(dtype=np.float64)
+    numbers[~((numbers >= 1) & (numbers <= 10))] = np.nan
+    return map_categories(values, numbers, np.nan)
+
+
+def decile_change(dataset, other):
+    """
+    Decile of each area of dataset minus its decile in other, for every
+    domain, NaN where either has no score or the area is not in other.
+    Kept with dataset for each other version.
+    """
+    def build(dataset):
+        rows = pd.Index(other.areas['geo_code']).get_indexer(dataset.areas['geo_code'])
+        matched = rows >= 0
+        changes = {}
+        for domain in DECILE_COLUMNS:
+            before = np.full(len(rows), np.nan)
+            before[matched] = decile_numbers(other.areas[domain])[rows[matched]]
+            changes[domain] = decile_numbers(dataset.areas[domain]) - before
+        return pd.DataFrame(changes, index=dataset.areas.index)
+    return dataset.derived(('decile_change', other.version), build)
+
+
+def change_groups(change):
+    """Group in CHANGE_ORDER of each change, as a categorical."""
+    change = np.asarray(change, dtype=np.float64)
+    codes = np.clip(np.nan_to_num(change, nan=0), -3, 3).astype(np.int8) + 3
+    codes[np.isnan(change)] = len(CHANGE_ORDER) - 1
+    return pd.Categorical.from_codes(codes, categories=CHANGE_ORDER)
@@ -0,0 +1,153 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+"""
+Compact binary columnar copy of the data files. Each column is stored in its
+own file: numbers as .npy arrays (coordinates as float32), categorical columns
+as small integer codes with their categories kept in meta.json, and text as
+the UTF-8 bytes of all the values with an array of their offsets, the layout
+of an Arrow string array. The files are memory-mapped when loaded, so the pages
+are shared between gunicorn workers through the OS page cache and loading takes
+milliseconds rather than parsing the CSV. Text columns are loaded as pyarrow
+backed strings over the mapped files, or decoded to Python strings if pyarrow
+is not installed. Missing values are kept missing in every kind of column.
+"""
+
+STORE_SUFFIX = '.columns'
+META_FILE = 'meta.json'
+
+# Stores written in an older layout are rebuilt from their CSV
+FORMAT_VERSION = 2
+
+
+def store_path(csv_path):
+    return os.path.splitext(csv_path)[0] + STORE_SUFFIX
+
+
+def source_fingerprint(path):
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def read_meta(store):
+    with open(os.path.join(store, META_FILE)) as f:
+        return json.load(f)
+
+
+def is_current(store, csv_path):
+    """
+    True if the store exists and was built from the CSV as it is now. A store
+    without its CSV next to it is used as it is.
+    """
+    if not os.path.exists(os.path.join(store, META_FILE)):
+        return False
+    if not os.path.exists(csv_path):
+        return True
+    meta = read_meta(store)
+    return meta.get('version')==FORMAT_VERSION and meta.get('source')==source_fingerprint(csv_path)
+
+
+def _smallest_int(n):
+    for dtype in (np.int8, np.int16, np.int32):
+        if n < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def write_table(df, store, categorical=(), source=None):
+    tmp = store + '.tmp'
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    columns = []
+    for i, name in enumerate(df.columns):
+        column = df[name]
+        filename = 'column_{}'.format(i)
+        if isinstance(column.dtype, pd.CategoricalDtype) or name in categorical:
+            column = column.astype('category')
+            categories = column.cat.categories.astype(str).tolist()
+            codes = column.cat.codes.to_numpy().astype(_smallest_int(len(categories)))
+            np.save(os.path.join(tmp, filename + '.npy'), codes)
+            columns.append({'name': name, 'kind': 'category', 'file': filename + '.npy', 'categories': categories})
+        elif column.dtype.kind=='f':
+            np.save(os.path.join(tmp, filename + '.npy'), column.to_numpy(dtype=np.float32))
+            columns.append({'name': name, 'kind': 'array', 'file': filename + '.npy'})
+        elif column.dtype.kind in 'iub':
+            np.save(os.path.join(tmp, filename + '.npy'), column.to_numpy())
+            columns.append({'name': name, 'kind': 'array', 'file': filename + '.npy'})
+        else:
+            columns.append(dict(_write_strings(column, os.path.join(tmp, filename)), name=name, kind='strings'))
+
+    with open(os.path.join(tmp, META_FILE), 'w') as f:
+        json.dump({'version': FORMAT_VERSION, 'rows': len(df), 'columns': columns, 'source': source}, f, indent=1)
+
+    shutil.rmtree(store, ignore_errors=True)
+    os.rename(tmp, store)
+
+
+def _write_strings(column, path):
+    missing = column.isna().to_numpy()
+    encoded = [b'' if m else str(value).encode('utf-8') for value, m in zip(column.tolist(), missing)]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    if offsets[-1] > np.iinfo(np.int32).max:
+        raise ValueError('Column {} has too much text for 32 bit offsets'.format(column.name))
+    np.save(path + '.offsets.npy', offsets.astype(np.int32))
+    with open(path + '.bytes', 'wb') as f:
+        f.write(b''.join(encoded))
+    files = {'offsets': os.path.basename(path) + '.offsets.npy', 'file': os.path.basename(path) + '.bytes'}
+    if missing.any():
+        np.save(path + '.missing.npy', missing)
+        files['missing'] = os.path.basename(path) + '.missing.npy'
+    return files
+
+
+def _read_strings(store, column):
+    offsets = np.load(os.path.join(store, column['offsets']), mmap_mode='r')
+    path = os.path.join(store, column['file'])
+    # An empty file can't be memory-mapped
+    data = np.memmap(path, dtype=np.uint8, mode='r') if os.path.getsize(path) else np.zeros(0, dtype=np.uint8)
+    missing = np.load(os.path.join(store, column['missing'])) if 'missing' in column else None
+    try:
+        import pyarrow as pa
+    except ImportError:
+        values = np.array([bytes(data[start:end]).decode('utf-8') for start, end in zip(offsets[:-1], offsets[1:])],
+                          dtype=object)
+        if missing is not None:
+            values[missing] = np.nan
+        return values
+
+    validity = None if missing is None else pa.py_buffer(np.packbits(~missing, bitorder='little'))
+    array = pa.Array.from_buffers(pa.string(), len(offsets) - 1,
+                                  [validity, pa.py_buffer(offsets), pa.py_buffer(data)])
+    return pd.arrays.ArrowStringArray(array)
+
+
+def read_table(store):
+    meta = read_meta(store)
+    data = {}
+    for column in meta['columns']:
+        path = os.path.join(store, column['file'])
+        if column['kind']=='strings':
+            data[column['name']] = _read_strings(store, column)
+        elif column['kind']=='text':
+            # Stores written before text was kept as strings, used only when their CSV is gone
+            with open(path, encoding='utf-8') as f:
+                data[column['name']] = np.array(f.read().split('\n') if meta['rows'] else [], dtype=object)
+        else:
+            values = np.load(path, mmap_mode='r')
+            if column['kind']=='category':
+                values = pd.Categorical.from_codes(values, categories=column['categories'])
+            data[column['name']] = values
+    return pd.DataFrame(data, copy=False)
+
+
+def build_store(csv_path, read_csv, categorical=()):
+    """Write the store for a CSV, read with read_csv, and return its path."""
+    store = store_path(csv_path)
+    write_table(read_csv(csv_path), store, categorical=categorical, source=source_fingerprint(csv_path))
+    return store
@@ -0,0 +1,364 @@
+import hashlib
+import os
+import re
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+import pandas as pd
+
+import columnar
+import metrics
+
+"""
+Loading of the Priority Places for Food Index and the Geolytix retail points
+used by the explorer. The loaded frames are held in a Dataset together with a
+version string derived from the files on disk, so that anything computed from
+the data (figures, indexes) can be keyed on it and rebuilt when the files change.
+"""
+
+DATA_DIR = os.getenv('DATA_DIR', '/app/data')
+AREAS_FILE = 'priority_places_Oct2022_WGS.csv'
+RETAILERS_FILE = 'retail_locations_glxv24_202206.csv'
+
+DECILE_COLUMNS = ['pp_dec_domain_supermarket_proximity',
+                  'pp_dec_domain_supermarket_accessibility',
+                  'pp_dec_domain_ecommerce_access',
+                  'pp_dec_domain_socio_demographic',
+                  'pp_dec_domain_nonsupermarket_proximity',
+                  'pp_dec_domain_food_for_families',
+                  'pp_dec_domain_fuel_poverty',
+                  'pp_dec_combined']
+
+# Hover labels for the domains which are not available in every country
+LABEL_COLUMNS = {'label_domain_supermarket_transport': 'pp_dec_domain_supermarket_accessibility',
+                 'label_domain_ecommerce_access': 'pp_dec_domain_ecommerce_access',
+                 'label_domain_fuel_poverty': 'pp_dec_domain_fuel_poverty'}
+
+
+# Text columns of the retailers held as categories in the columnar store
+RETAILER_CATEGORIES = ['retailer', 'size_band', 'size_code']
+
+
+def map_categories(values, lookup, missing):
+    """
+    lookup[i] for each value of a categorical in its i-th category, and
+    missing for missing values, found from the codes without a pass over the
+    values in Python.
+    """
+    # Missing values have code -1, which picks the missing value added at the end
+    return np.append(np.asarray(lookup), missing)[values.cat.codes.to_numpy()]
+
+
+def read_areas_csv(path):
+    return pd.read_csv(path, dtype={column: 'category' for column in DECILE_COLUMNS})
+
+
+def read_retailers_csv(path):
+    return pd.read_csv(path)
+
+
+def load_areas(path):
+    # The columnar store built by scripts/build_columnar.py is used when it is
+    # up to date with the CSV, which is otherwise parsed directly
+    store = columnar.store_path(path)
+    with metrics.timed(metrics.LOAD_PHASE_SECONDS) as timer:
+        if columnar.is_current(store, path):
+            timer.label(phase='areas_columnar')
+            df = columnar.read_table(store)
+        else:
+            timer.label(phase='areas_csv')
+            df = read_areas_csv(path)
+
+    with metrics.timed(metrics.LOAD_PHASE_SECONDS, phase='area_labels'):
+        for label, column in LABEL_COLUMNS.items():
+            # Same codes as the decile column with the '0' category renamed
+            categories = ['NA' if c=='0' else c for c in df[column].cat.categories]
+            df[label] = pd.Categorical.from_codes(df[column].cat.codes.to_numpy(), categories=categories)
+
+    return df
+
+
+def load_retailers(path):
+    store = columnar.store_path(path)
+    with metrics.timed(metrics.LOAD_PHASE_SECONDS) as timer:
+        if columnar.is_current(store, path):
+            timer.label(phase='retailers_columnar')
+            return columnar.read_table(store)
+        timer.label(phase='retailers_csv')
+        return read_retailers_csv(path)
+
+
+def files_version(paths):
+    # Cheap fingerprint of the data files, changes whenever any of them is replaced
+    digest = hashlib.sha1()
+    for path in paths:
+        if not os.path.exists(path):
+            path = os.path.join(columnar.store_path(path), columnar.META_FILE)
+        stat = os.stat(path)
+        digest.update('{}:{}:{}'.format(os.path.basename(path), stat.st_size, stat.st_mtime_ns).encode())
+    return digest.hexdigest()[:12]
+
+
+class Dataset:
+
+    def __init__(self, areas, retailers, version, releases=None, on_derived=None):
+        self.areas = areas
+        self.retailers = retailers
+        self.version = version
+        # (index release, retail points release) when loaded by a DatasetRegistry
+        self.releases = releases
+        # Called after each derived value is added, for the registry to keep to its budget
+        self.on_derived = on_derived
+        # Rough memory held by the derived values, see value_bytes
+        self.derived_nbytes = 0
+        # key -> future of the value, so each is built once by whichever thread asks first
+        self._derived = {}
+        self._lock = threading.Lock()
+
+    def derived(self, key, build):
+        """
+        Return build(self), computed on first use and then kept for as long
+        as the dataset is loaded. Used for indexes and summaries of the data.
+        Other threads asking for the same key wait for it to be built.
+        """
+        with self._lock:
+            future = self._derived.get(key)
+            building = future is None
+            if building:
+                future = self._derived[key] = Future()
+        if building:
+            try:
+                value = build(self)
+            except BaseException as e:
+                with self._lock:
+                    del self._derived[key]
+                future.set_exception(e)
+                raise
+            nbytes = value_bytes(value, exclude=(self, self.areas, self.retailers))
+            with self._lock:
+                self.derived_nbytes += nbytes
+            future.set_result(value)
+            if self.on_derived is not None:
+                self.on_derived()
+        return future.result()
+
+
+def load_dataset(areas_path, retailers_path):
+    version = files_version([areas_path, retailers_path])
+    return Dataset(load_areas(areas_path), load_retailers(retailers_path), version)
+
+
+def table_bytes(df):
+    # Memory held by a table, including memory-mapped columns
+    return int(df.memory_usage(deep=True).sum())
+
+
+def value_bytes(value, exclude=(), _seen=None):
+    """
+    Rough memory held by a value: the arrays and frames in it and in the
+    containers and objects holding them. Objects in exclude are not counted.
+    """
+    seen = {id(v) for v in exclude} if _seen is None else _seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        usage = value.memory_usage(deep=False)
+        return int(usage.sum() if isinstance(usage, pd.Series) else usage)
+    if isinstance(value, pd.Categorical):
+        return value.nbytes
+    if isinstance(value, (bytes, str)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(value_bytes(k, _seen=seen) + value_bytes(v, _seen=seen) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sum(value_bytes(v, _seen=seen) for v in value)
+    # Spatial trees keep their points in data and the order of them in indices
+    data = getattr(value, 'data', None)
+    if isinstance(data, np.ndarray):
+        return data.nbytes + getattr(getattr(value, 'indices', None), 'nbytes', 0)
+    if hasattr(value, '__dict__'):
+        return value_bytes(vars(value), _seen=seen)
+    return sys.getsizeof(value)
+
+
+# Releases are told apart by the part of the file name between these
+AREAS_PATTERN = re.compile(r'^priority_places_(.+)_WGS(\.csv|' + re.escape(columnar.STORE_SUFFIX) + ')$')
+RETAILERS_PATTERN = re.compile(r'^retail_locations_(.+?)(\.csv|' + re.escape(columnar.STORE_SUFFIX) + ')$')
+
+
+def _release(pattern, filename):
+    match = pattern.match(os.path.basename(filename))
+    return match.group(1) if match else None
+
+
+class DatasetRegistry:
+    """
+    The index and retail point releases found in data_dir, any pair of which
+    can be used as a dataset. Only the file names are read until a dataset is
+    asked for. The tables of each release are then loaded once and shared by
+    every dataset using them, so that picking another pair or comparing two
+    releases only loads the releases not loaded yet. Datasets are kept up to
+    max_bytes of tables and derived values, beyond which the least recently
+    used are dropped, along with the tables no other dataset uses. The budget
+    is checked when a dataset is loaded and whenever a derived value is added
+    to one. Tables are reloaded when their files change.
+
+    Loading happens outside of the registry lock, so other threads carry on
+    with the datasets already loaded; threads asking for a table being loaded
+    wait for it. Functions added with add_listener are called with the
+    versions of the loaded datasets after any of them is added or dropped.
+    """
+
+    def __init__(self, data_dir, max_bytes=512 * 2**20):
+        self.data_dir = data_dir
+        self.max_bytes = max_bytes
+        self._datasets = OrderedDict()
+        # (kind, release) -> (file version, future of the table, its size)
+        self._tables = {}
+        self._releases = None
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def releases(self):
+        """({release: areas csv path}, {release: retailers csv path}), sorted by release."""
+        try:
+            mtime = os.stat(self.data_dir).st_mtime_ns
+        except OSError:
+            return {}, {}
+        if self._releases is None or self._releases[0]!=mtime:
+            areas, retailers = {}, {}
+            for filename in sorted(os.listdir(self.data_dir)):
+                for pattern, found in ((AREAS_PATTERN, areas), (RETAILERS_PATTERN, retailers)):
+                    release = _release(pattern, filename)
+                    if release is not None:
+                        # A columnar store without its CSV is loaded through the CSV path
+                        found[release] = os.path.join(self.data_dir, os.path.splitext(filename)[0] + '.csv')
+            self._releases = (mtime, (areas, retailers))
+        return self._releases[1]
+
+    def default_releases(self):
+        """
+        The releases used when none is asked for: AREAS_RELEASE and
+        RETAILERS_RELEASE if set, else those of AREAS_FILE and RETAILERS_FILE,
+        else the last of each.
+        """
+        defaults = []
+        for found, variable, filename, pattern in ((self.releases()[0], 'AREAS_RELEASE', AREAS_FILE, AREAS_PATTERN),
+                                                   (self.releases()[1], 'RETAILERS_RELEASE', RETAILERS_FILE, RETAILERS_PATTERN)):
+            release = os.getenv(variable) or _release(pattern, filename)
+            defaults.append(release if release in found or not found else list(found)[-1])
+        return tuple(defaults)
+
+    def paths(self, areas_release=None, retailers_release=None):
+        default_areas, default_retailers = self.default_releases()
+        areas, retailers = self.releases()
+        areas_release = areas_release or default_areas
+        retailers_release = retailers_release or default_retailers
+        if areas_release not in areas:
+            raise KeyError('Unknown index release {}'.format(areas_release))
+        if retailers_release not in retailers:
+            raise KeyError('Unknown retail points release {}'.format(retailers_release))
+        return (areas_release, retailers_release), areas[areas_release], retailers[retailers_release]
+
+    def _table(self, kind, release, path):
+        # The table of a release, loaded by the first thread asking for it
+        key = (kind, release)
+        version = files_version([path])
+        with self._lock:
+            entry = self._tables.get(key)
+            loading = entry is None or entry['version']!=version
+            if loading:
+                entry = self._tables[key] = {'version': version, 'future': Future(), 'nbytes': 0}
+        if loading:
+            try:
+                table = load_areas(path) if kind=='areas' else load_retailers(path)
+            except BaseException as e:
+                with self._lock:
+                    if self._tables.get(key) is entry:
+                        del self._tables[key]
+                entry['future'].set_exception(e)
+                raise
+            entry['nbytes'] = table_bytes(table)
+            entry['future'].set_result(table)
+        return entry['future'].result()
+
+    def _nbytes(self):
+        # Tables of the kept datasets, counted once however many use them, and their derived values
+        tables = {(kind, release) for d in self._datasets.values()
+                  for kind, release in zip(('areas', 'retailers'), d.releases)}
+        return (sum(self._tables[key]['nbytes'] for key in tables if key in self._tables)
+                + sum(d.derived_nbytes for d in self._datasets.values()))
+
+    def get(self, areas_release=None, retailers_release=None):
+        """
+        The dataset of the releases (the defaults if None), loaded on first
+        use. Raises KeyError for a release that is not in data_dir.
+        """
+        key, areas_path, retailers_path = self.paths(areas_release, retailers_release)
+        version = files_version([areas_path, retailers_path])
+        with self._lock:
+            dataset = self._datasets.get(key)
+            if dataset is not None and dataset.version==version:
+                self._datasets.move_to_end(key)
+                return dataset
+
+        areas = self._table('areas', key[0], areas_path)
+        retailers = self._table('retailers', key[1], retailers_path)
+        with self._lock:
+            dataset = self._datasets.get(key)
+            if dataset is None or dataset.version!=version or dataset.areas is not areas \
+                    or dataset.retailers is not retailers:
+                dataset = self._datasets[key] = Dataset(areas, retailers, version, releases=key,
+                                                        on_derived=self.trim)
+            self._datasets.move_to_end(key)
+            self._evict()
+            versions = {d.version for d in self._datasets.values()}
+
+        for listener in self._listeners:
+            listener(versions)
+        return dataset
+
+    def _evict(self):
+        # Drop the least recently used datasets while over the budget, keeping
+        # the most recent even if it is over the budget on its own, and the
+        # tables no dataset uses any more. Returns whether any were dropped
+        evicted = False
+        while len(self._datasets) > 1 and self._nbytes() > self.max_bytes:
+            self._datasets.popitem(last=False)
+            evicted = True
+        used = {(kind, release) for d in self._datasets.values()
+                for kind, release in zip(('areas', 'retailers'), d.releases)}
+        for table in [table for table, entry in self._tables.items()
+                      if table not in used and entry['future'].done()]:
+            del self._tables[table]
+        return evicted
+
+    def trim(self):
+        """Drop datasets until the registry is within its budget again."""
+        with self._lock:
+            if not self._evict():
+                return
+            versions = {d.version for d in self._datasets.values()}
+        for listener in self._listeners:
+            listener(versions)
+
+
+datasets = DatasetRegistry(DATA_DIR, max_bytes=int(os.getenv('DATASET_MEMORY_MB', '512')) * 2**20)
+
+
+def current_dataset(areas_release=None, retailers_release=None):
+    """
+    Return the dataset of the given releases (the default ones if None),
+    loading it first if it is not loaded or its files have changed since.
+    """
+    return datasets.get(areas_release, retailers_release)
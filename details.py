@@ -0,0 +1,82 @@
+from dash import html
+
+from figures import parse_point_id
+from nearby import DEFAULT_RADIUS_KM, nearby_stores
+
+"""
+Details of the area or store under the cursor, shown in the panel below the
+map. The points on the map only carry an id, so the details are looked up
+here from the loaded tables.
+"""
+
+AREA_DETAILS = [('Priority Places Index decile', 'pp_dec_combined'),
+                ('Proximity to supermarket retail facilities decile', 'pp_dec_domain_supermarket_proximity'),
+                ('Accessibility to supermarket retail facilties decile', 'label_domain_supermarket_transport'),
+                ('Access to online deliveries decile', 'label_domain_ecommerce_access'),
+                ('Proximity to non-supermarket food provision decile', 'pp_dec_domain_nonsupermarket_proximity'),
+                ('Socio-demographic barriers decile', 'pp_dec_domain_socio_demographic'),
+                ('Food support for families decile', 'pp_dec_domain_food_for_families'),
+                ('Fuel poverty decile', 'label_domain_fuel_poverty')]
+
+PLACEHOLDER = html.Small('Hover over or click on a point on the map to see its details. Clicking on an area also shows the stores nearby.')
+
+
+def area_details(areas, row):
+    area = areas.iloc[row]
+    return html.Div([
+        html.B('{} ({})'.format(area['geo_label'], area['geo_code'])),
+        html.Ul([html.Li('{}: {}'.format(label, area[column])) for label, column in AREA_DETAILS])
+    ])
+
+
+def area_store_details(dataset, row):
+    # Stores around the centroid of a clicked area
+    area = dataset.areas.iloc[row]
+    nearby = nearby_stores(dataset, [area['latitude']], [area['longitude']])
+    stores = dataset.retailers.iloc[nearby['rows'][0]]
+    within = ', '.join('{} {}'.format(int(counts[0]), size)
+                       for size, counts in sorted(nearby['within'].items()) if counts[0])
+    return html.Div([
+        html.B('Nearest stores'),
+        html.Ul([html.Li('{} ({}), {:.2f} km'.format(store['retailer'], store['size_code'], distance))
+                 for (_, store), distance in zip(stores.iterrows(), nearby['distances'][0])]),
+        html.P([
+            html.Small('Stores within {:g} km: {}'.format(DEFAULT_RADIUS_KM, within or 'none')),
+            html.Br(),
+            html.Small('Distance to nearest large store: {:.2f} km'.format(nearby['large_km'][0])),
+        ])
+    ])
+
+
+def retailer_details(retailers, row):
+    store = retailers.iloc[row]
+    return html.Div([
+        html.B(store['retailer']),
+        html.Ul([html.Li('Size: {}'.format(store['size_code']))])
+    ])
+
+
+def point_details(dataset, event_data, with_stores=False):
+    """
+    Details for the first point in a hoverData or clickData event, or None
+    if it is not an area or store (such as a grid cell summary). With
+    with_stores, the stores around an area are included.
+    """
+    points = (event_data or {}).get('points') or [{}]
+    customdata = points[0].get('customdata')
+    if customdata is None:
+        return None
+
+    table, row = parse_point_id(customdata[-1] if isinstance(customdata, list) else customdata)
+    return row_details(dataset, table, row, with_stores)
+
+
+def row_details(dataset, table, row, with_stores=False):
+    # Details for a row of the areas or retailers table
+    if table=='areas' and row < len(dataset.areas):
+        if with_stores:
+            return html.Div([area_details(dataset.areas, row), area_store_details(dataset, row)])
+        return area_details(dataset.areas, row)
+    if table=='retailers' and row < len(dataset.retailers):
+        return retailer_details(dataset.retailers, row)
+    return None
@@ -0,0 +1,148 @@
+import io
+import json
+
+import numpy as np
+
+from changes import change_groups, decile_change
+from dataset import DECILE_COLUMNS, map_categories
+from nearby import nearby_stores
+from regions import ALL, region_slices
+
+"""
+Export of the areas on the map as CSV, GeoJSON or Parquet. The selected rows
+are worked out up front, then the file is written and sent CHUNK_ROWS areas
+at a time by a generator, so the whole file is never held in memory.
+"""
+
+CHUNK_ROWS = 5000
+
+EXPORT_COLUMNS = ['geo_code', 'geo_label', 'latitude', 'longitude'] + DECILE_COLUMNS
+
+# Added with the nearest store to each area, and the stores within DEFAULT_RADIUS_KM
+STORE_COLUMNS = ['nearest_store', 'nearest_store_size', 'nearest_store_km',
+                 'stores_within_radius', 'nearest_large_store_km']
+
+# Mimetype and file extension of each format
+FORMATS = {'csv': ('text/csv', 'csv'),
+           'geojson': ('application/geo+json', 'geojson'),
+           'parquet': ('application/vnd.apache.parquet', 'parquet')}
+
+
+def parquet_available():
+    try:
+        import pyarrow.parquet
+    except ImportError:
+        return False
+    return True
+
+
+def selected_rows(dataset, domain, deciles=None, region=ALL, other=None, changes=None):
+    """
+    Rows of the areas in the region whose decile for domain is one of deciles
+    (all if None). With other, the dataset of another index release, only the
+    areas whose change since other is in one of the changes groups of
+    CHANGE_ORDER (all if None) are kept, as on the maps comparing releases.
+    """
+    slices = region_slices(dataset)
+    rows = np.arange(len(dataset.areas)) if region==ALL else slices.areas[region]
+    if deciles is not None:
+        values = dataset.areas[domain]
+        keep = map_categories(values, np.isin(values.cat.categories.astype(str), list(deciles)), False)
+        rows = rows[keep[rows]]
+    if other is not None and changes is not None:
+        groups = change_groups(decile_change(dataset, other)[domain].to_numpy()[rows])
+        rows = rows[np.isin(np.asarray(groups), list(changes))]
+    return rows
+
+
+def export_chunks(dataset, rows, with_stores=False):
+    # Frames of the exported columns for CHUNK_ROWS rows at a time, at least one even if empty
+    for start in range(0, max(len(rows), 1), CHUNK_ROWS):
+        chunk = dataset.areas.iloc[rows[start:start + CHUNK_ROWS]][EXPORT_COLUMNS].reset_index(drop=True)
+        chunk = chunk.astype({column: str for column in DECILE_COLUMNS})
+        chunk = chunk.astype({'latitude': np.float64, 'longitude': np.float64}).round({'latitude': 6, 'longitude': 6})
+        if with_stores and len(chunk) and len(dataset.retailers):
+            nearby = nearby_stores(dataset, chunk['latitude'], chunk['longitude'], k=1)
+            nearest = dataset.retailers.iloc[nearby['rows'][:, 0]]
+            chunk['nearest_store'] = nearest['retailer'].astype(str).to_numpy()
+            chunk['nearest_store_size'] = nearest['size_code'].astype(str).to_numpy()
+            chunk['nearest_store_km'] = nearby['distances'][:, 0].round(3)
+            chunk['stores_within_radius'] = sum(nearby['within'].values())
+            chunk['nearest_large_store_km'] = nearby['large_km'].round(3)
+        elif with_stores:
+            chunk = chunk.reindex(columns=EXPORT_COLUMNS + STORE_COLUMNS)
+        yield chunk
+
+
+def csv_stream(chunks):
+    for i, chunk in enumerate(chunks):
+        yield chunk.to_csv(index=False, header=i==0)
+
+
+def _json_value(value):
+    # numpy scalars left in the records
+    return value.item() if isinstance(value, np.generic) else str(value)
+
+
+def geojson_stream(chunks):
+    yield '{"type": "FeatureCollection", "features": ['
+    separator = ''
+    for chunk in chunks:
+        coordinates = zip(chunk['longitude'].tolist(), chunk['latitude'].tolist())
+        properties = chunk.drop(columns=['latitude', 'longitude']).to_dict('records')
+        features = [json.dumps({'type': 'Feature',
+                                'geometry': {'type': 'Point', 'coordinates': list(point)},
+                                'properties': p}, default=_json_value)
+                    for point, p in zip(coordinates, properties)]
+        if features:
+            yield separator + ',\n'.join(features)
+            separator = ',\n'
+    yield ']}\n'
+
+
+class _Sink(io.RawIOBase):
+    # File object collecting what is written to it until drained
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+def parquet_stream(chunks):
+    # Each chunk is written as a row group and sent as soon as it is written
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = _Sink()
+    writer = None
+    for chunk in chunks:
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(sink, table.schema)
+        writer.write_table(table)
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+STREAMS = {'csv': csv_stream, 'geojson': geojson_stream, 'parquet': parquet_stream}
+
+
+def export_stream(dataset, rows, export_format, with_stores=False):
+    return STREAMS[export_format](export_chunks(dataset, rows, with_stores))
@@ -0,0 +1,352 @@
+import math
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+from changes import CHANGE_COLORS, CHANGE_ORDER
+
+"""
+Plotly figure for the Priority Places map, shared by the explorer callbacks.
+"""
+
+colormap = ['#0d0887',
+            '#41049d',
+            '#6a00a8',
+            '#8f0da4',
+            '#b12a90',
+            '#c94a79',
+            '#db6a68',
+            '#e58858',
+            '#e8a34a',
+            '#e1bf40']
+
+DECILE_ORDER = ['1', '2', '3', '4', '5', '6', '7', '8', '9', '10']
+
+# Deciles keep their colour whichever of them are on the map
+DECILE_COLORS = dict(zip(DECILE_ORDER, colormap))
+
+# Group of the areas with no decile, kept on the map but hidden like the -1 code
+MISSING_DECILE = 'NA'
+HIDDEN_DECILES = ['-1', MISSING_DECILE]
+
+CENTER = {'lat': 53.8067, 'lon': -1.5550}
+ZOOM = 8
+
+# Size of the map in the page, used to fit views to it before the browser reports its own
+MAP_SIZE = {'width': 1400, 'height': 450}
+
+# Zoom used to show an area found by searching
+AREA_ZOOM = 13
+
+# Mapbox tiles are 512 pixels wide
+TILE_SIZE = 512
+
+# Points only carry an id, the details of an area or store are looked up on
+# the server when it is hovered or clicked (see details.py). Areas are
+# identified by their row in the areas table and retailers by -1 - their row.
+AREA_CUSTOM_DATA = ['row_id']
+
+AREA_HOVERTEMPLATE = 'Decile %{fullData.name}<extra></extra>'
+
+CHANGE_HOVERTEMPLATE = 'Decile change %{fullData.name}<extra></extra>'
+
+RETAILER_HOVERTEMPLATE = 'Store<extra></extra>'
+
+SIZE_HOVERTEMPLATE = 'Store (%{fullData.name})<extra></extra>'
+
+# Store sizes from smallest to largest, and their colours when the stores are coloured by size
+SIZE_ORDER = ['Small convenience', 'Mid-size', 'Large', 'Very large']
+SIZE_COLORS = dict(zip(SIZE_ORDER, ['#a1d99b', '#41ab5d', '#006d2c', '#00441b']))
+
+
+def retailer_ids(rows):
+    return -1 - np.asarray(rows)
+
+
+def parse_point_id(point_id):
+    """Returns ('areas', row) or ('retailers', row) for the id of a point."""
+    return ('areas', point_id) if point_id >= 0 else ('retailers', -1 - point_id)
+
+
+def decile_groups(values):
+    """
+    Group the areas by decile the same way plotly express splits them into
+    traces in build_figure: deciles 1 to 10 first and any other values (NA
+    codes, and MISSING_DECILE for missing values) after them in order of
+    appearance. Returns the (name, color, visible) of each group and the
+    group index of every row.
+    """
+    values = pd.Series(values)
+    strings = values.astype(str).to_numpy(dtype=object)
+    strings[values.isna().to_numpy()] = MISSING_DECILE
+    uniques = pd.unique(strings)
+    deciles = [v for v in DECILE_ORDER if v in uniques]
+    others = [v for v in uniques if v not in DECILE_ORDER]
+    names = deciles + others
+    groups = []
+    for name in names:
+        if name in DECILE_COLORS:
+            color = DECILE_COLORS[name]
+        else:
+            color = colormap[(len(DECILE_COLORS) + others.index(name)) % len(colormap)]
+        group = {'name': name, 'color': color}
+        if name in HIDDEN_DECILES:
+            group['visible'] = False
+        elif name in DECILE_ORDER and int(name) > 1:
+            group['visible'] = 'legendonly'
+        groups.append(group)
+
+    codes = pd.Categorical(strings, categories=names).codes
+    return groups, codes
+
+
+def encode_codes(codes):
+    """
+    Compact JSON encoding of small integer codes: one character per value
+    (the code plus 48, so 0 is '0') while the codes fit in printable ASCII,
+    otherwise a plain list.
+    """
+    codes = np.asarray(codes)
+    if len(codes) and (codes.min() < 0 or codes.max() > 126 - 48):
+        return codes.tolist()
+    return (codes + 48).astype(np.uint8).tobytes().decode('ascii')
+
+
+def regroup_update(areas, domain):
+    """
+    Payload for switching the map to another domain: the decile groups and the
+    group of every row, encoded as one character per row, which the browser
+    uses to re-partition the points already on the map.
+    """
+    groups, codes = decile_groups(areas[domain])
+    return {'type': 'regroup',
+            'domain': domain,
+            'groups': groups,
+            'codes': encode_codes(codes)}
+
+
+def retailer_trace(retailers):
+    return go.Scattermapbox(lat=retailers['lat_wgs'],
+                            lon=retailers['long_wgs'],
+                            customdata=retailer_ids(retailers.index)[:, None],
+                            hovertemplate=RETAILER_HOVERTEMPLATE,
+                            legendgroup='',
+                            marker={'color': '#808080', 'opacity':0.2},
+                            meta='retailers',
+                            mode='markers',
+                            name='',
+                            showlegend=False,
+                            subplot='mapbox')
+
+
+def retailer_size_traces(retailers):
+    """One trace of the stores of each size, coloured by size."""
+    sizes = retailers['size_code']
+    if not isinstance(sizes.dtype, pd.CategoricalDtype):
+        sizes = sizes.astype('category')
+    categories = sizes.cat.categories.astype(str).tolist()
+    codes = sizes.cat.codes.to_numpy()
+    traces = []
+    for size in SIZE_ORDER + sorted(set(categories) - set(SIZE_ORDER)):
+        if size not in categories:
+            continue
+        rows = np.flatnonzero(codes==categories.index(size))
+        if not len(rows):
+            continue
+        traces.append(go.Scattermapbox(lat=retailers['lat_wgs'].to_numpy()[rows],
+                                       lon=retailers['long_wgs'].to_numpy()[rows],
+                                       customdata=retailer_ids(retailers.index[rows])[:, None],
+                                       hovertemplate=SIZE_HOVERTEMPLATE,
+                                       legendgroup='stores',
+                                       marker={'color': SIZE_COLORS.get(size, '#808080'), 'opacity': 0.6},
+                                       meta='retailers',
+                                       mode='markers',
+                                       name=size,
+                                       subplot='mapbox'))
+    return traces
+
+
+def retailer_traces(retailers, by_size=False):
+    return retailer_size_traces(retailers) if by_size else [retailer_trace(retailers)]
+
+
+def retailer_update(retailers, show_retailers, by_size=False):
+    # Payload for replacing the retailer traces on the map, or removing them
+    return {'type': 'retailers',
+            'traces': retailer_traces(retailers, by_size) if show_retailers else []}
+
+
+def mercator_y(lat):
+    return math.log(math.tan(math.pi / 4 + math.radians(lat) / 2))
+
+
+def mercator_lat(y):
+    return math.degrees(2 * math.atan(math.exp(y)) - math.pi / 2)
+
+
+def view_bounds(center, zoom, width, height):
+    # (south, west, north, east) shown by a map of the given size in pixels
+    radians_per_pixel = 2 * math.pi / (TILE_SIZE * 2**zoom)
+    y = mercator_y(center['lat'])
+    half_width = math.degrees(radians_per_pixel * width / 2)
+    return (mercator_lat(y - radians_per_pixel * height / 2), center['lon'] - half_width,
+            mercator_lat(y + radians_per_pixel * height / 2), center['lon'] + half_width)
+
+
+def fit_bounds(bounds, width=MAP_SIZE['width'], height=MAP_SIZE['height']):
+    # Centre and largest zoom showing the whole bounding box
+    south, west, north, east = bounds['south'], bounds['west'], bounds['north'], bounds['east']
+    y = (mercator_y(south) + mercator_y(north)) / 2
+    zoom = min(math.log2(width * 2 * math.pi / (TILE_SIZE * max(math.radians(east - west), 1e-9))),
+               math.log2(height * 2 * math.pi / (TILE_SIZE * max(mercator_y(north) - mercator_y(south), 1e-9))))
+    return {'lat': mercator_lat(y), 'lon': (west + east) / 2}, zoom
+
+
+def area_view_update(areas, row):
+    # Payload for moving the map to an area
+    return {'type': 'view',
+            'center': {'lat': float(areas['latitude'].iloc[row]), 'lon': float(areas['longitude'].iloc[row])},
+            'zoom': AREA_ZOOM}
+
+
+def style_layout(fig):
+    fig.update_layout(mapbox_style='carto-positron')
+    fig.update_layout(margin={'r':0, 't':0, 'l':0, 'b':0})
+    fig.update_layout(legend=dict(
+        yanchor="top",
+        y=0.95,
+        xanchor="right",
+        x=0.99,
+        itemsizing='constant'
+    ))
+    fig.update_layout(legend_title_text='Decile (1 = highest priority)')
+
+
+def build_figure(areas, retailers, domain, show_retailers, center=CENTER, zoom=ZOOM, by_size=False):
+
+    values = areas[domain].cat.remove_unused_categories()
+    # plotly express would leave out the areas with no decile
+    if values.isna().any():
+        values = values.cat.add_categories(MISSING_DECILE).fillna(MISSING_DECILE)
+    fig = px.scatter_mapbox(
+                        areas.assign(row_id=areas.index, **{domain: values}),
+                        lat='latitude',
+                        lon='longitude',
+                        color=domain,
+                        color_discrete_sequence=colormap,
+                        color_discrete_map=DECILE_COLORS,
+                        custom_data=AREA_CUSTOM_DATA,
+                        center=center,
+                        zoom=zoom,
+                        category_orders={domain: DECILE_ORDER})
+
+    style_layout(fig)
+    fig.update_traces(hovertemplate=AREA_HOVERTEMPLATE)
+    fig.update_traces(visible='legendonly', selector=(lambda x: x.name in DECILE_ORDER and int(x.name) > 1))
+    fig.update_traces(visible=False, selector=(lambda x: x.name in HIDDEN_DECILES))
+
+    if show_retailers:
+        fig.add_traces(retailer_traces(retailers, by_size))
+        fig.update_layout(coloraxis_showscale=False)
+
+    fig.update_geos(fitbounds="locations", visible=True)
+    return fig
+
+
+def build_change_figure(areas, retailers, changes, show_retailers, center=CENTER, zoom=ZOOM, by_size=False):
+    """
+    Map of the change in decile of each area against another release, with
+    changes the groups from changes.change_groups for the rows of areas.
+    """
+    fig = px.scatter_mapbox(
+                        areas.assign(row_id=areas.index, change=changes.remove_unused_categories()),
+                        lat='latitude',
+                        lon='longitude',
+                        color='change',
+                        color_discrete_map=CHANGE_COLORS,
+                        custom_data=AREA_CUSTOM_DATA,
+                        center=center,
+                        zoom=zoom,
+                        category_orders={'change': CHANGE_ORDER})
+
+    style_layout(fig)
+    fig.update_layout(legend_title_text='Decile change (- = higher priority)')
+    fig.update_traces(hovertemplate=CHANGE_HOVERTEMPLATE)
+    fig.update_traces(visible='legendonly', selector=(lambda x: x.name=='No change'))
+    fig.update_traces(visible=False, selector=(lambda x: x.name=='NA'))
+
+    if show_retailers:
+        fig.add_traces(retailer_traces(retailers, by_size))
+    return fig
+
+
+def _columns(df, columns):
+    # Column-oriented encoding of the columns sent to the browser
+    encoded = {}
+    for column in columns:
+        values = df[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            encoded[column] = {'categories': values.cat.categories.astype(str).tolist(),
+                               'codes': encode_codes(values.cat.codes)}
+        else:
+            encoded[column] = {'values': values.tolist()}
+    return encoded
+
+
+def _without_points(trace):
+    trace = trace.to_plotly_json()
+    for key in ('lat', 'lon', 'customdata'):
+        trace.pop(key, None)
+    return trace
+
+
+def clientside_payload(areas, retailers, domains):
+    """
+    Everything the browser needs to draw the map for any of the domains and
+    either retailer toggle state without asking the server again: the area
+    and retailer columns, the decile grouping of every domain and the trace
+    and layout templates, taken from the figure built by build_figure so the
+    map looks the same as the one drawn on the server.
+    """
+    template = build_figure(areas.iloc[:1], retailers.iloc[:1], domains[0], True)
+    domain_groups = {}
+    for domain in domains:
+        groups, codes = decile_groups(areas[domain])
+        domain_groups[domain] = {'groups': groups, 'codes': encode_codes(codes)}
+
+    return {
+        'layout': template.layout.to_plotly_json(),
+        'areas': {
+            'trace': _without_points(template.data[0]),
+            'lat': np.round(areas['latitude'].to_numpy(dtype=np.float64), 5).tolist(),
+            'lon': np.round(areas['longitude'].to_numpy(dtype=np.float64), 5).tolist(),
+            'customdata': AREA_CUSTOM_DATA,
+            'columns': _columns(areas.assign(row_id=areas.index), AREA_CUSTOM_DATA),
+            'domains': domain_groups,
+        },
+        'retailers': {
+            'trace': _without_points(template.data[-1]),
+            'lat': np.round(retailers['lat_wgs'].to_numpy(dtype=np.float64), 5).tolist(),
+            'lon': np.round(retailers['long_wgs'].to_numpy(dtype=np.float64), 5).tolist(),
+            'customdata': ['point_id'],
+            'columns': _columns(retailers.assign(point_id=retailer_ids(retailers.index)), ['point_id']),
+        },
+    }
+
+
+def tile_map_payload(areas, retailers, domains):
+    """
+    What the browser needs to draw the map from the vector tiles served by
+    tiles.py: the layout, a trace template for the legend entries and the
+    decile groups of each domain, each of which is drawn as a mapbox layer
+    reading the matching layer of the area tiles.
+    """
+    template = build_figure(areas.iloc[:1], retailers.iloc[:1], domains[0], True)
+    return {
+        'layout': template.layout.to_plotly_json(),
+        'trace': _without_points(template.data[0]),
+        'retailer_marker': template.data[-1].marker.to_plotly_json(),
+        'domains': {domain: decile_groups(areas[domain])[0] for domain in domains},
+    }
@@ -0,0 +1,21 @@
+import os
+import shutil
+
+"""
+Gunicorn settings for combining the Prometheus metrics of every worker
+(see metrics.py). The command line options in the Dockerfile set the rest.
+"""
+
+
+def on_starting(server):
+    # Metrics left over from a previous run of the server would be counted again
+    path = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+
+
+def child_exit(server, worker):
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,132 @@
+import os
+import threading
+import time
+
+"""
+Prometheus metrics for the explorer, exported at /metrics when the
+METRICS_ENABLED environment variable is set to 1. With several gunicorn
+workers, PROMETHEUS_MULTIPROC_DIR must also be set (see gunicorn.conf.py) so
+that the values from every worker are combined. When metrics are switched
+off, every metric below is a no-op and prometheus_client is not imported.
+"""
+
+ENABLED = os.getenv('METRICS_ENABLED')=='1'
+
+# How often each worker samples its resident memory
+MEMORY_SAMPLE_SECONDS = float(os.getenv('MEMORY_SAMPLE_SECONDS', '15'))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = tuple(1000 * 4**i for i in range(10))
+
+
+class _NoOp:
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, value):
+        pass
+
+    def inc(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+
+if ENABLED:
+    from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram,
+                                   REGISTRY, generate_latest, multiprocess)
+
+    MAP_CALLBACK_SECONDS = Histogram('pp_map_callback_seconds',
+                                     'Time taken by the map callbacks',
+                                     ['update', 'domain', 'retailers'], buckets=LATENCY_BUCKETS)
+    FIGURE_BUILD_SECONDS = Histogram('pp_figure_build_seconds',
+                                     'Time taken to build a map figure or update with plotly',
+                                     ['update', 'domain', 'retailers'], buckets=LATENCY_BUCKETS)
+    FIGURE_SERIALIZE_SECONDS = Histogram('pp_figure_serialize_seconds',
+                                         'Time taken to serialize (and compress) a map figure or update',
+                                         ['update', 'domain', 'retailers'], buckets=LATENCY_BUCKETS)
+    MAP_RESPONSE_BYTES = Histogram('pp_map_response_bytes',
+                                   'Size of the JSON map figure or update sent to the browser',
+                                   ['update', 'domain', 'retailers'], buckets=SIZE_BUCKETS)
+    FIGURE_CACHE_REQUESTS = Counter('pp_figure_cache_requests',
+                                    'Requests to the figure cache',
+                                    ['result'])
+    TILE_CACHE_REQUESTS = Counter('pp_tile_cache_requests',
+                                  'Requests to the vector tile cache, by where the tile was found',
+                                  ['layer', 'result'])
+    LOAD_PHASE_SECONDS = Gauge('pp_load_phase_seconds',
+                               'Duration of the last run of each data loading and startup phase',
+                               ['phase'], multiprocess_mode='liveall')
+    WORKER_MEMORY_BYTES = Gauge('pp_worker_resident_memory_bytes',
+                                'Resident memory of the worker process',
+                                multiprocess_mode='liveall')
+else:
+    MAP_CALLBACK_SECONDS = FIGURE_BUILD_SECONDS = FIGURE_SERIALIZE_SECONDS = MAP_RESPONSE_BYTES = _NoOp()
+    FIGURE_CACHE_REQUESTS = TILE_CACHE_REQUESTS = LOAD_PHASE_SECONDS = WORKER_MEMORY_BYTES = _NoOp()
+
+
+class timed:
+    """
+    Context manager observing the time taken by its block in a histogram,
+    or setting it on a gauge. Labels can be added inside the block with
+    .label(), for when they are only known once the work is done.
+    """
+
+    def __init__(self, metric, **labels):
+        self.metric = metric
+        self.labels = labels
+
+    def label(self, **labels):
+        self.labels.update(labels)
+
+    def __enter__(self):
+        if ENABLED:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if ENABLED:
+            metric = self.metric.labels(**self.labels) if self.labels else self.metric
+            duration = time.perf_counter() - self.start
+            if hasattr(metric, 'observe'):
+                metric.observe(duration)
+            else:
+                metric.set(duration)
+
+
+def record_memory():
+    if not ENABLED:
+        return
+    try:
+        with open('/proc/self/statm') as f:
+            WORKER_MEMORY_BYTES.set(int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE'))
+    except OSError:
+        # Not on Linux, ru_maxrss (peak rather than current) is the nearest available
+        import resource
+        WORKER_MEMORY_BYTES.set(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)
+
+
+def metrics_view():
+    record_memory()
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), 200, {'Content-Type': CONTENT_TYPE_LATEST}
+
+
+def _sample_memory():
+    while True:
+        record_memory()
+        time.sleep(MEMORY_SAMPLE_SECONDS)
+
+
+def register(server):
+    # Memory is sampled by a thread in each worker rather than on requests, as
+    # /metrics is answered by only one of the workers
+    if ENABLED:
+        server.add_url_rule('/metrics', 'metrics', metrics_view)
+        threading.Thread(target=_sample_memory, name='memory-sampler', daemon=True).start()
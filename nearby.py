@@ -0,0 +1,96 @@
+import numpy as np
+
+from spatial import AreaIndex, StoreIndex
+
+"""
+Nearest store queries for areas and coordinates, answered for whole batches
+at once from KD-trees built on first use for each loaded dataset.
+"""
+
+DEFAULT_K = 5
+DEFAULT_RADIUS_KM = 1.0
+
+
+def store_index(dataset):
+    return dataset.derived('store_index', lambda d: StoreIndex(d.retailers['lat_wgs'],
+                                                              d.retailers['long_wgs'],
+                                                              d.retailers['size_code']))
+
+
+def area_index(dataset):
+    return dataset.derived('area_index', lambda d: AreaIndex(d.areas['geo_code'],
+                                                            d.areas['latitude'],
+                                                            d.areas['longitude']))
+
+
+def nearby_stores(dataset, lat, lon, k=DEFAULT_K, radius_km=DEFAULT_RADIUS_KM):
+    """
+    For each point: the k nearest stores (rows and distances in km), the
+    number of stores of each size code within radius_km and the distance to
+    the nearest large store.
+    """
+    index = store_index(dataset)
+    distances, rows = index.nearest(lat, lon, k)
+    large_km, _ = index.nearest_large(lat, lon)
+    return {'distances': distances,
+            'rows': rows,
+            'within': index.count_within(lat, lon, radius_km),
+            'large_km': large_km}
+
+
+def _km(value):
+    # Distances are rounded to metres, and missing (no large store at all) as null
+    return round(float(value), 3) if np.isfinite(value) else None
+
+
+def nearby_records(dataset, queries, k=DEFAULT_K, radius_km=DEFAULT_RADIUS_KM):
+    """
+    JSON-ready results for a batch of queries, each either {'geo_code': ...}
+    or {'lat': ..., 'lon': ...}. Coordinates are matched to the area with the
+    nearest centroid.
+    """
+    areas = dataset.areas
+    lat = np.array([q.get('lat', np.nan) for q in queries], dtype=np.float64)
+    lon = np.array([q.get('lon', np.nan) for q in queries], dtype=np.float64)
+
+    # Areas asked for by geo_code are looked up, coordinates matched to the nearest area
+    by_code = np.array(['geo_code' in q for q in queries], dtype=bool)
+    area_rows = np.full(len(queries), -1)
+    area_rows[by_code] = area_index(dataset).rows([queries[i]['geo_code'] for i in np.flatnonzero(by_code)])
+    found = area_rows >= 0
+    lat[found] = areas['latitude'].to_numpy()[area_rows[found]]
+    lon[found] = areas['longitude'].to_numpy()[area_rows[found]]
+    by_point = ~by_code & np.isfinite(lat) & np.isfinite(lon)
+    if by_point.any():
+        area_rows[by_point] = area_index(dataset).nearest(lat[by_point], lon[by_point])[1]
+
+    valid = found | by_point
+    results = [{'query': query, 'error': 'Unknown geo_code' if 'geo_code' in query else 'Invalid coordinates'}
+               for query in queries]
+    if not valid.any():
+        return results
+
+    nearby = nearby_stores(dataset, lat[valid], lon[valid], k, radius_km)
+    retailers = dataset.retailers
+    ids = retailers['id'].to_numpy()[nearby['rows']]
+    names = retailers['retailer'].to_numpy()[nearby['rows']]
+    sizes = retailers['size_code'].to_numpy()[nearby['rows']]
+    within_total = sum(nearby['within'].values(), np.zeros(len(ids), dtype=np.int64))
+    geo_codes = areas['geo_code'].to_numpy()[area_rows[valid]]
+
+    for j, i in enumerate(np.flatnonzero(valid)):
+        results[i] = {
+            'query': queries[i],
+            'geo_code': geo_codes[j],
+            'lat': round(float(lat[i]), 6),
+            'lon': round(float(lon[i]), 6),
+            'nearest_stores': [{'id': int(ids[j, n]),
+                                'retailer': names[j, n],
+                                'size_code': sizes[j, n],
+                                'distance_km': _km(nearby['distances'][j, n])}
+                               for n in range(ids.shape[1])],
+            'stores_within_radius': dict({size: int(counts[j]) for size, counts in nearby['within'].items()},
+                                         total=int(within_total[j])),
+            'nearest_large_store_km': _km(nearby['large_km'][j]),
+        }
+    return results
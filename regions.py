@@ -0,0 +1,82 @@
+import numpy as np
+
+from figures import CENTER, ZOOM, fit_bounds
+from nearby import area_index
+
+"""
+Country filter for the map. The rows of the areas and retailers in each
+country are worked out once per loaded dataset, so that a filtered figure is
+built from a precomputed slice of the tables, centred and zoomed on it.
+"""
+
+ALL = 'all'
+
+REGIONS = {ALL: 'United Kingdom',
+           'E': 'England',
+           'W': 'Wales',
+           'S': 'Scotland',
+           'N': 'Northern Ireland'}
+
+# geo_code prefixes of the LSOAs, Data Zones and Small Areas of each country
+GEO_CODE_PREFIXES = {'E01': 'E', 'W01': 'W', 'S01': 'S', '95': 'N'}
+
+
+def area_countries(geo_codes):
+    geo_codes = np.asarray(geo_codes, dtype=str)
+    countries = np.full(len(geo_codes), '', dtype='<U1')
+    for prefix, country in GEO_CODE_PREFIXES.items():
+        countries[np.char.startswith(geo_codes, prefix)] = country
+    return countries
+
+
+class RegionSlices:
+    """
+    Rows of the areas and retailers in each country, and the view fitting
+    each country. Retailers are placed in the country of their nearest area.
+    """
+
+    def __init__(self, dataset):
+        areas = dataset.areas
+        self.area_countries = area_countries(areas['geo_code'])
+        if len(dataset.retailers):
+            _, nearest = area_index(dataset).nearest(dataset.retailers['lat_wgs'], dataset.retailers['long_wgs'])
+            retailer_countries = self.area_countries[nearest]
+        else:
+            retailer_countries = np.empty(0, dtype='<U1')
+
+        self.areas = {}
+        self.retailers = {}
+        self.views = {ALL: (CENTER, ZOOM)}
+        for region in REGIONS:
+            if region==ALL:
+                continue
+            rows = np.flatnonzero(self.area_countries==region)
+            self.areas[region] = rows
+            self.retailers[region] = np.flatnonzero(retailer_countries==region)
+            if len(rows):
+                lat = areas['latitude'].to_numpy()[rows]
+                lon = areas['longitude'].to_numpy()[rows]
+                self.views[region] = fit_bounds({'south': float(lat.min()), 'west': float(lon.min()),
+                                                 'north': float(lat.max()), 'east': float(lon.max())})
+            else:
+                self.views[region] = (CENTER, ZOOM)
+
+    def frames(self, dataset, region):
+        # The areas and retailers in the region, keeping their row labels
+        if region==ALL or region not in self.areas:
+            return dataset.areas, dataset.retailers
+        return dataset.areas.iloc[self.areas[region]], dataset.retailers.iloc[self.retailers[region]]
+
+    def view(self, region):
+        # Centre and zoom showing the region
+        return self.views.get(region, self.views[ALL])
+
+    def contains(self, region, rows):
+        # Which of the area rows are in the region
+        if region==ALL or region not in self.areas:
+            return np.ones(len(rows), dtype=bool)
+        return self.area_countries[rows]==region
+
+
+def region_slices(dataset):
+    return dataset.derived('region_slices', RegionSlices)
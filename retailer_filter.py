@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+
+from figures import SIZE_ORDER
+from regions import ALL, region_slices
+
+"""
+Filtering of the stores shown on the map by retailer and size. The rows of
+every retailer, size and region are held as bitsets (np.packbits of a mask)
+built from the categorical codes once per dataset, so any combination of
+filters is an OR of the bitsets picked in each filter and an AND across them.
+"""
+
+# Groups of retailers offered in the filter alongside single retailers
+RETAILER_GROUPS = {'Discounters': ['Aldi', 'Lidl'],
+                   'Frozen food': ['Iceland', 'Farmfoods', 'Heron']}
+
+# Every retailer with this in its name is in the co-operatives group
+CO_OPERATIVE = 'Co-op'
+
+GROUP_PREFIX = 'group:'
+
+
+def _categories(values):
+    if not isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.astype('category')
+    return values.cat.categories.astype(str).tolist(), values.cat.codes.to_numpy()
+
+
+class RetailerMasks:
+
+    def __init__(self, dataset):
+        self.n = len(dataset.retailers)
+        names, name_codes = _categories(dataset.retailers['retailer'])
+        sizes, size_codes = _categories(dataset.retailers['size_code'])
+        self.retailer_bits = {name: np.packbits(name_codes==i) for i, name in enumerate(names)}
+        self.size_bits = {size: np.packbits(size_codes==i) for i, size in enumerate(sizes)}
+
+        slices = region_slices(dataset)
+        self.region_bits = {}
+        for region, rows in slices.retailers.items():
+            mask = np.zeros(self.n, dtype=bool)
+            mask[rows] = True
+            self.region_bits[region] = np.packbits(mask)
+        self.all_bits = np.packbits(np.ones(self.n, dtype=bool))
+        self.no_bits = np.packbits(np.zeros(self.n, dtype=bool))
+
+        self.groups = {group: [name for name in members if name in self.retailer_bits]
+                       for group, members in RETAILER_GROUPS.items()}
+        self.groups['Co-operatives'] = [name for name in names if CO_OPERATIVE in name]
+        self.groups = {group: members for group, members in self.groups.items() if members}
+
+    def retailers(self, values):
+        # Retailer names of the filter values, with the groups expanded
+        names = set()
+        for value in values:
+            if value.startswith(GROUP_PREFIX):
+                names.update(self.groups.get(value[len(GROUP_PREFIX):], []))
+            else:
+                names.add(value)
+        return names
+
+    def _any(self, bits, keys):
+        # Rows in any of keys, or every row if keys is None (nothing picked in
+        # the filter). Picks matching no rows, such as a group with no stores
+        # in this release, give no rows
+        if keys is None:
+            return self.all_bits
+        picked = [bits[key] for key in keys if key in bits]
+        return np.bitwise_or.reduce(picked) if picked else self.no_bits
+
+    def rows(self, retailers=(), sizes=(), region=ALL):
+        """Rows of the stores of any of the retailers and sizes (all if empty) in the region."""
+        names = self.retailers(retailers) if retailers else None
+        bits = self._any(self.retailer_bits, names) & self._any(self.size_bits, sizes or None)
+        if region!=ALL and region in self.region_bits:
+            bits = bits & self.region_bits[region]
+        return np.flatnonzero(np.unpackbits(bits, count=self.n))
+
+    def options(self):
+        """Options of the retailer and size filters."""
+        retailers = ([{'label': '{} ({})'.format(group, ', '.join(members) if len(members) <= 3
+                                                 else '{} retailers'.format(len(members))),
+                       'value': GROUP_PREFIX + group}
+                      for group, members in self.groups.items()] +
+                     [{'label': name, 'value': name} for name in sorted(self.retailer_bits)])
+        sizes = [{'label': size, 'value': size}
+                 for size in SIZE_ORDER + sorted(set(self.size_bits) - set(SIZE_ORDER)) if size in self.size_bits]
+        return retailers, sizes
+
+
+def retailer_masks(dataset):
+    return dataset.derived('retailer_masks', RetailerMasks)
+
+
+def filter_key(values):
+    # Filter values in a canonical, hashable form for cache keys
+    return tuple(sorted(set(values or ())))
+
+
+def filtered_retailers(dataset, retailers=(), sizes=(), region=ALL):
+    """The stores of the retailers and sizes in the region, keeping their row labels."""
+    if not retailers and not sizes:
+        return region_slices(dataset).frames(dataset, region)[1]
+    return dataset.retailers.iloc[retailer_masks(dataset).rows(retailers, sizes, region)]
@@ -0,0 +1,317 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+from dataset import AREAS_FILE, DECILE_COLUMNS, RETAILERS_FILE
+from scripts.synthetic_data import AREAS_ROWS, write_dataset
+
+"""
+Benchmarks the explorer against synthetic data (see synthetic_data.py) at one
+or more sizes, fully offline. For each size it measures, in a fresh process,
+the time taken to import app.py and load the data, the latency and JSON size
+of the map callback for every domain and retailer toggle, and the peak memory
+used. It then starts gunicorn locally and measures the throughput and latency
+of the Dash callback endpoint under concurrent clients. Results are written
+as JSON so that they can be compared between commits:
+
+    python -m scripts.benchmark --areas 42619 250000 1000000 --output benchmark.json
+"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()!=''
+        return {'commit': commit, 'dirty': dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {'commit': None, 'dirty': None}
+
+
+def app_env(data_dir):
+    return dict(os.environ, DATA_DIR=data_dir, PYTHONPATH=ROOT)
+
+
+def map_callback(app):
+    # The callback sending the map in the app's MAP_MODE, as f(domain, show_retailers)
+    if app.MAP_MODE=='viewport':
+        return lambda domain, show_retailers: app.display_viewport_map(domain, show_retailers, None)
+    if app.MAP_MODE=='clientside':
+        return lambda domain, show_retailers: app.send_map_data(None, None)
+    return lambda domain, show_retailers: app.display_map(domain, show_retailers, app.ALL, *[None] * 7)[0]
+
+
+def measure_app(repeat):
+    """Runs in its own process (--measure-app) so that imports and memory start from nothing."""
+    import plotly.io as pio
+
+    start = time.perf_counter()
+    import app
+    import_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    app.current_dataset()
+    load_seconds = time.perf_counter() - start
+
+    callback = map_callback(app)
+    callbacks = []
+    for option in app.DOMAIN_OPTIONS:
+        for show_retailers in (False, True):
+            # The first call builds the figure, later ones are served from the figure cache
+            start = time.perf_counter()
+            result = callback(option['value'], show_retailers)
+            cold = time.perf_counter() - start
+
+            warm = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                callback(option['value'], show_retailers)
+                warm.append(time.perf_counter() - start)
+
+            callbacks.append({'domain': option['value'],
+                              'retailers': show_retailers,
+                              'cold_seconds': cold,
+                              'warm_median_seconds': statistics.median(warm) if warm else None,
+                              'warm_max_seconds': max(warm) if warm else None,
+                              'json_bytes': len(pio.to_json(result, validate=False))})
+
+    return {'map_mode': app.MAP_MODE,
+            'import_seconds': import_seconds,
+            'load_seconds': load_seconds,
+            'callbacks': callbacks,
+            # ru_maxrss is in kilobytes on Linux
+            'peak_rss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024}
+
+
+def run_app_measurement(data_dir, repeat):
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, '-m', 'scripts.benchmark', '--measure-app', '--repeat', str(repeat)],
+                             cwd=ROOT, env=app_env(data_dir), capture_output=True, text=True)
+    if process.returncode!=0:
+        raise RuntimeError('App measurement failed:\n' + process.stderr)
+    result = json.loads(process.stdout.strip().splitlines()[-1])
+    result['process_seconds'] = time.perf_counter() - start
+    return result
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def worker_peak_rss(pid):
+    # Peak resident memory of each gunicorn worker, from /proc (Linux only)
+    try:
+        with open('/proc/{0}/task/{0}/children'.format(pid)) as f:
+            children = f.read().split()
+    except OSError:
+        return None
+    peaks = []
+    for child in children:
+        try:
+            with open('/proc/{}/status'.format(child)) as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        peaks.append(int(line.split()[1]) * 1024)
+        except OSError:
+            pass
+    return peaks
+
+
+def callback_bodies():
+    # Requests to the Dash callback endpoint for the full map, for every domain and toggle
+    return [json.dumps({'output': '..figure_update.data...figure_version.data..',
+                        'outputs': [{'id': 'figure_update', 'property': 'data'},
+                                    {'id': 'figure_version', 'property': 'data'}],
+                        'inputs': [{'id': 'domain', 'property': 'value', 'value': domain},
+                                   {'id': 'retailer_switch', 'property': 'on', 'value': show_retailers},
+                                   {'id': 'region', 'property': 'value', 'value': 'all'},
+                                   {'id': 'search', 'property': 'value', 'value': None},
+                                   {'id': 'release', 'property': 'value', 'value': None},
+                                   {'id': 'retail_release', 'property': 'value', 'value': None},
+                                   {'id': 'compare', 'property': 'value', 'value': None},
+                                   {'id': 'retailer_filter', 'property': 'value', 'value': None},
+                                   {'id': 'size_filter', 'property': 'value', 'value': None}],
+                        'changedPropIds': ['domain.value'],
+                        'state': [{'id': 'figure_version', 'property': 'data', 'value': None}]}).encode()
+            for domain in DECILE_COLUMNS for show_retailers in (False, True)]
+
+
+def post(url, body, timeout):
+    request = urllib.request.Request(url, data=body, headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return len(response.read())
+
+
+def run_load(url, bodies, clients, duration, timeout):
+    latencies = []
+    errors = []
+    received = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(offset):
+        i = offset
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                size = post(url, bodies[i % len(bodies)], timeout)
+            except Exception as e:
+                with lock:
+                    errors.append(repr(e))
+            else:
+                with lock:
+                    latencies.append(time.perf_counter() - start)
+                    received[0] += size
+            i += 1
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    return {'clients': clients,
+            'seconds': elapsed,
+            'requests': len(latencies),
+            'errors': len(errors),
+            'first_error': errors[0] if errors else None,
+            'requests_per_second': len(latencies) / elapsed,
+            'megabytes_per_second': received[0] / elapsed / 1e6,
+            'latency_p50_seconds': percentile(latencies, 50),
+            'latency_p95_seconds': percentile(latencies, 95),
+            'latency_p99_seconds': percentile(latencies, 99)}
+
+
+def run_http(data_dir, workers, threads, clients, duration, timeout):
+    port = free_port()
+    url = 'http://127.0.0.1:{}'.format(port)
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--workers={}'.format(workers),
+                               '--threads={}'.format(threads), '--timeout=600', '-b', '127.0.0.1:{}'.format(port),
+                               'app:server'],
+                              cwd=ROOT, env=app_env(data_dir), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        start = time.perf_counter()
+        while True:
+            if server.poll() is not None:
+                raise RuntimeError('gunicorn exited:\n' + server.stderr.read().decode())
+            try:
+                urllib.request.urlopen(url + '/_dash-layout', timeout=5).read()
+                break
+            except OSError:
+                if time.perf_counter() - start > timeout:
+                    raise RuntimeError('gunicorn did not start within {}s'.format(timeout))
+                time.sleep(0.2)
+        ready_seconds = time.perf_counter() - start
+
+        # Every worker builds its own figures, so warm up with enough requests to reach them all
+        bodies = callback_bodies()
+        endpoint = url + '/_dash-update-component'
+        start = time.perf_counter()
+        for _ in range(workers):
+            for body in bodies:
+                post(endpoint, body, timeout)
+        warmup_seconds = time.perf_counter() - start
+
+        result = run_load(endpoint, bodies, clients, duration, timeout)
+        result.update({'workers': workers, 'threads': threads, 'ready_seconds': ready_seconds,
+                       'warmup_seconds': warmup_seconds, 'worker_peak_rss_bytes': worker_peak_rss(server.pid)})
+        return result
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--areas', type=int, nargs='+', default=[AREAS_ROWS],
+                        help='numbers of areas to generate, one benchmark run each')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data-dir', help='directory for the synthetic data (a temporary one by default)')
+    parser.add_argument('--csv', action='store_true', help='load the CSVs rather than building the columnar store')
+    parser.add_argument('--repeat', type=int, default=5, help='warm callback calls per domain and toggle')
+    parser.add_argument('--no-http', action='store_true', help='skip the gunicorn load test')
+    parser.add_argument('--workers', type=int, default=5)
+    parser.add_argument('--threads', type=int, default=1)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10, help='seconds of load per run')
+    parser.add_argument('--timeout', type=float, default=600)
+    parser.add_argument('--output', help='file to write the JSON results to (stdout by default)')
+    parser.add_argument('--measure-app', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure_app:
+        print(json.dumps(measure_app(args.repeat)))
+        return
+
+    base_dir = args.data_dir or tempfile.mkdtemp(prefix='explorer-benchmark-')
+    results = dict(git_commit(),
+                   created=datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                   python=platform.python_version(),
+                   platform=platform.platform(),
+                   cpus=os.cpu_count(),
+                   columnar=not args.csv,
+                   runs=[])
+    try:
+        for areas in args.areas:
+            data_dir = os.path.join(base_dir, str(areas))
+            print('Benchmarking {} areas'.format(areas), file=sys.stderr)
+
+            start = time.perf_counter()
+            write_dataset(data_dir, areas, seed=args.seed)
+            if not args.csv:
+                subprocess.run([sys.executable, '-m', 'scripts.build_columnar', '--data-dir', data_dir],
+                               cwd=ROOT, env=app_env(data_dir), check=True, stdout=subprocess.DEVNULL)
+            run = {'areas': areas, 'generate_seconds': time.perf_counter() - start}
+
+            with open(os.path.join(data_dir, RETAILERS_FILE)) as f:
+                run['retailers'] = sum(1 for _ in f) - 1
+            run['areas_file_bytes'] = os.path.getsize(os.path.join(data_dir, AREAS_FILE))
+
+            run['app'] = run_app_measurement(data_dir, args.repeat)
+            if not args.no_http:
+                run['http'] = run_http(data_dir, args.workers, args.threads, args.clients,
+                                       args.duration, args.timeout)
+            results['runs'].append(run)
+    finally:
+        if not args.data_dir:
+            shutil.rmtree(base_dir, ignore_errors=True)
+
+    output = json.dumps(results, indent=1)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__=="__main__":
+    main()
@@ -0,0 +1,44 @@
+import argparse
+import os
+import time
+
+import columnar
+from dataset import (AREAS_FILE, RETAILERS_FILE, RETAILER_CATEGORIES, load_areas, load_retailers,
+                     read_areas_csv, read_retailers_csv)
+
+"""
+Builds the columnar copies of the data files which the explorer loads in
+place of the CSVs (see columnar.py). Run from the repository root after the
+data files change:
+
+    python -m scripts.build_columnar --data-dir /app/data
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--data-dir', default='/app/data')
+    args = parser.parse_args()
+
+    for filename, read_csv, load, categorical in [(AREAS_FILE, read_areas_csv, load_areas, ()),
+                                                  (RETAILERS_FILE, read_retailers_csv, load_retailers, RETAILER_CATEGORIES)]:
+        csv_path = os.path.join(args.data_dir, filename)
+        if not os.path.exists(csv_path):
+            print('Skipping {}, file not found'.format(csv_path))
+            continue
+
+        start = time.perf_counter()
+        read_csv(csv_path)
+        csv_time = time.perf_counter() - start
+
+        store = columnar.build_store(csv_path, read_csv, categorical=categorical)
+
+        start = time.perf_counter()
+        load(csv_path)
+        store_time = time.perf_counter() - start
+
+        print('Built {} (CSV load {:.3f}s, columnar load {:.3f}s)'.format(store, csv_time, store_time))
+
+
+if __name__=="__main__":
+    main()
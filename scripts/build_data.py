@@ -0,0 +1,340 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import columnar
+from dataset import AREAS_FILE, DECILE_COLUMNS, RETAILERS_FILE, RETAILER_CATEGORIES
+from regions import REGIONS, area_countries
+from scripts.state import code_version, read_json, write_json
+
+"""
+Builds the data files read by the explorer from the source data:
+
+1. Scotland Data Zone 2011 population weighted centroids
+   https://www.data.gov.uk/dataset/8aabd120-6e15-41bf-be7c-2536cbc4b2e5/data-zone-centroids-2011
+2. England and Wales LSOA 2011 population weighted centroids
+   https://geoportal.statistics.gov.uk/datasets/ons::lsoa-dec-2011-population-weighted-centroids-in-england-and-wales/
+3. Northern Ireland Super Output Area boundaries
+   https://www.nisra.gov.uk/publications/super-output-area-boundaries-gis-format
+4. The Priority Places for Food Index
+   https://data.cdrc.ac.uk/dataset/priority-places-food-index
+5. GEOLYTIX UK Retail Points
+   https://geolytix.com/blog/supermarket-retail-points/
+
+The centroids of the three sources are put in one table, moved to WGS84 with
+one vectorised transform per source projection and joined to the index on
+geo_code. The retail points are given the size code of their size band and
+cleaned. The outputs are checked (row counts, duplicate codes, missing or
+out of place coordinates) before the CSVs and their columnar copies (see
+columnar.py) are written to the data directory.
+
+The result of each stage is cached, keyed on a hash of the contents of its
+input files, of the code of the build and of the stages it depends on, so only the stages
+whose inputs changed are run again: with a new Geolytix release only the
+retail points are processed. Needs pyproj, and geopandas to read the
+shapefiles. Run from the repository root with:
+
+    python -m scripts.build_data --source-dir /data --data-dir /app/data \
+        --retail-points '/data/GEOLYTIX - UK RetailPoints/uk_glx_open_retail_points_v24_202206.csv'
+"""
+
+SOURCES = {'index': 'priority_places_for_food_oct22.csv',
+           'ew_centroids': 'Lower_layer_Super_Output_Areas_(December_2011)_Population_Weighted_Centroids.csv',
+           'scotland_centroids': 'SG_DataZoneCent_2011/SG_DataZone_Cent_2011.shp',
+           'ni_areas': 'SOA2011_Esri_Shapefile_0.zip',
+           'retail_points': 'GEOLYTIX - UK RetailPoints/uk_glx_open_retail_points_v24_202206.csv'}
+
+# Coordinates of the England and Wales centroids
+BRITISH_NATIONAL_GRID = 'EPSG:27700'
+WGS84 = 'EPSG:4326'
+
+SIZE_CODES = {'< 3,013 ft2 (280m2)': 'Small convenience',
+              '3,013 < 15,069 ft2 (280 < 1,400 m2)': 'Mid-size',
+              '15,069 < 30,138 ft2 (1,400 < 2,800 m2)': 'Large',
+              '30,138 ft2 > (2,800 m2)': 'Very large'}
+
+RETAILER_COLUMNS = ['id', 'retailer', 'long_wgs', 'lat_wgs', 'size_band', 'size_code']
+
+# (south, west, north, east) the points must be within
+UK_BOUNDS = (49.8, -8.7, 61.0, 2.0)
+
+# Source files whose changes alter the output of the stages
+CODE_FILES = ['scripts/build_data.py', 'columnar.py', 'dataset.py', 'regions.py']
+
+
+class ValidationError(ValueError):
+    pass
+
+
+### Stages
+
+def read_ew_centroids(path):
+    df = pd.read_csv(path, usecols=['lsoa11cd', 'lsoa11nm', 'X', 'Y'])
+    return pd.DataFrame({'geo_code': df['lsoa11cd'], 'geo_label': df['lsoa11nm'],
+                         'x': df['X'], 'y': df['Y'], 'crs': BRITISH_NATIONAL_GRID})
+
+
+def _read_shapefile(path):
+    import geopandas as gpd
+    return gpd.read_file(path)
+
+
+def read_scotland_centroids(path):
+    gdf = _read_shapefile(path)
+    return pd.DataFrame({'geo_code': gdf['DataZone'], 'geo_label': gdf['Name'],
+                         'x': gdf.geometry.x, 'y': gdf.geometry.y, 'crs': gdf.crs.to_string()})
+
+
+def read_ni_centroids(path):
+    # Centroids of the area boundaries, in their own projection
+    gdf = _read_shapefile(path)
+    centroids = gdf.geometry.centroid
+    return pd.DataFrame({'geo_code': gdf['SOA_CODE'], 'geo_label': gdf['SOA_LABEL'],
+                         'x': centroids.x, 'y': centroids.y, 'crs': gdf.crs.to_string()})
+
+
+def combine_centroids(ew, scotland, ni):
+    from pyproj import Transformer
+
+    centroids = pd.concat([ew, scotland, ni], ignore_index=True)
+    longitude = np.empty(len(centroids))
+    latitude = np.empty(len(centroids))
+    for crs, rows in centroids.groupby('crs').indices.items():
+        transformer = Transformer.from_crs(crs, WGS84, always_xy=True)
+        longitude[rows], latitude[rows] = transformer.transform(centroids['x'].to_numpy()[rows],
+                                                                centroids['y'].to_numpy()[rows])
+
+    duplicated = centroids['geo_code'][centroids['geo_code'].duplicated()]
+    if len(duplicated):
+        raise ValidationError('{} geo codes have several centroids, such as {}'.format(
+            len(duplicated), ', '.join(duplicated[:5])))
+    return pd.DataFrame({'geo_code': centroids['geo_code'], 'geo_label': centroids['geo_label'],
+                         'longitude': longitude, 'latitude': latitude})
+
+
+def join_areas(index_path, centroids):
+    index = pd.read_csv(index_path, index_col=0)
+    index = index.rename_axis('geo_code').reset_index()
+    deciles = [column for column in index.columns if column.startswith('pp_dec')]
+    missing = [column for column in DECILE_COLUMNS if column not in deciles]
+    if missing:
+        raise ValidationError('The index has no {} column'.format(', '.join(missing)))
+
+    areas = index[['geo_code'] + deciles].merge(centroids, on='geo_code', how='left', validate='one_to_one',
+                                                indicator=True)
+    unmatched = areas['geo_code'][areas['_merge']=='left_only']
+    if len(unmatched):
+        countries = pd.Series(area_countries(unmatched)).map(REGIONS).fillna('unknown country').value_counts()
+        raise ValidationError('{} areas of the index have no centroid ({}), such as {}'.format(
+            len(unmatched), ', '.join('{} in {}'.format(n, country) for country, n in countries.items()),
+            ', '.join(unmatched[:5])))
+    areas = areas[['geo_code', 'geo_label', 'longitude', 'latitude'] + deciles]
+    areas[deciles] = areas[deciles].astype('Int64')
+
+    _check_points(areas, 'geo_code', 'latitude', 'longitude', 'areas')
+    return areas
+
+
+def clean_retail_points(path):
+    df = pd.read_csv(path)
+    df['size_code'] = df['size_band'].map(SIZE_CODES)
+    unknown = df['size_band'][df['size_code'].isna()].unique()
+    if len(unknown):
+        raise ValidationError('Unknown size bands {}'.format(', '.join(map(str, unknown))))
+
+    # Stores outside mainland Britain and Northern Ireland have no county
+    keep = (df['county'].notna() & ~df['store_name'].str.contains('Scilly', na=False)
+            & (df['store_name']!='Spar Old Town Store'))
+    retailers = df.loc[keep, RETAILER_COLUMNS].reset_index(drop=True)
+
+    if not len(retailers):
+        raise ValidationError('No retail points left after cleaning')
+    _check_points(retailers, 'id', 'lat_wgs', 'long_wgs', 'retail points')
+    return retailers
+
+
+def _check_points(df, key, lat, lon, name):
+    duplicated = df[key][df[key].duplicated()]
+    if len(duplicated):
+        raise ValidationError('{} {} are duplicated, such as {}'.format(
+            len(duplicated), name, ', '.join(map(str, duplicated[:5]))))
+    missing = df[key][df[lat].isna() | df[lon].isna()]
+    if len(missing):
+        raise ValidationError('{} {} have no coordinates, such as {}'.format(
+            len(missing), name, ', '.join(map(str, missing[:5]))))
+    south, west, north, east = UK_BOUNDS
+    outside = df[key][~(df[lat].between(south, north) & df[lon].between(west, east))]
+    if len(outside):
+        raise ValidationError('{} {} are outside the UK, such as {}'.format(
+            len(outside), name, ', '.join(map(str, outside[:5]))))
+
+
+### Stage cache
+
+class Stage:
+    """
+    Output of a stage, built or read from the cache when first used. Its key
+    is known without building it, so a stage whose key is unchanged does not
+    need the stages it depends on.
+    """
+
+    def __init__(self, pipeline, name, key, build, args):
+        self.pipeline = pipeline
+        self.name = name
+        self.key = key
+        self._build = build
+        self._args = args
+        self._frame = None
+
+    @property
+    def frame(self):
+        if self._frame is None:
+            self._frame = self.pipeline.load_or_build(self)
+        return self._frame
+
+
+class Pipeline:
+
+    def __init__(self, cache_dir, force=False, log=sys.stderr):
+        self.cache_dir = cache_dir
+        self.force = force
+        self.log = log
+        os.makedirs(cache_dir, exist_ok=True)
+        self._hashes_path = os.path.join(cache_dir, 'file_hashes.json')
+        self._hashes = read_json(self._hashes_path)
+        self._code = code_version(CODE_FILES)
+
+    def file_hash(self, path):
+        # Content hash of a file, or of every file of a shapefile, kept while
+        # the files' sizes and modification times are unchanged
+        paths = [path]
+        if path.endswith('.shp'):
+            stem = os.path.splitext(os.path.basename(path))[0]
+            directory = os.path.dirname(path) or '.'
+            paths = sorted(os.path.join(directory, f) for f in os.listdir(directory)
+                           if os.path.splitext(f)[0]==stem)
+
+        digest = hashlib.sha1()
+        for p in paths:
+            stat = os.stat(p)
+            fingerprint = [stat.st_size, stat.st_mtime_ns]
+            entry = self._hashes.get(p)
+            if entry is None or entry['stat']!=fingerprint:
+                content = hashlib.sha1()
+                with open(p, 'rb') as f:
+                    for block in iter(lambda: f.read(2**20), b''):
+                        content.update(block)
+                entry = self._hashes[p] = {'stat': fingerprint, 'sha1': content.hexdigest()}
+                write_json(self._hashes_path, self._hashes)
+            digest.update(entry['sha1'].encode())
+        return digest.hexdigest()
+
+    def stage(self, name, build, *args):
+        """
+        Stage running build(*args), where args are input file paths or other
+        stages whose frames are passed in their place.
+        """
+        # Any change to the code, including the helpers and constants the
+        # stages use, builds every stage again
+        parts = [name, self._code]
+        for arg in args:
+            parts.append(arg.key if isinstance(arg, Stage) else self.file_hash(arg))
+        key = hashlib.sha1(json.dumps(parts).encode()).hexdigest()[:16]
+        return Stage(self, name, key, build, args)
+
+    def _path(self, stage):
+        return os.path.join(self.cache_dir, '{}-{}.pkl'.format(stage.name, stage.key))
+
+    def load_or_build(self, stage):
+        path = self._path(stage)
+        if os.path.exists(path) and not self.force:
+            self._print('cached   {}'.format(stage.name))
+            return pd.read_pickle(path)
+
+        args = [arg.frame if isinstance(arg, Stage) else arg for arg in stage._args]
+        start = time.perf_counter()
+        frame = stage._build(*args)
+        self._print('built    {} ({} rows, {:.2f}s)'.format(stage.name, len(frame), time.perf_counter() - start))
+
+        frame.to_pickle(path + '.tmp')
+        os.replace(path + '.tmp', path)
+        # Earlier outputs of the stage are not needed again
+        for f in os.listdir(self.cache_dir):
+            if f.startswith(stage.name + '-') and f.endswith('.pkl') and f!=os.path.basename(path):
+                os.remove(os.path.join(self.cache_dir, f))
+        return frame
+
+    def write(self, stage, path, categorical=()):
+        """
+        Write the output of a stage as a CSV and its columnar copy, unless
+        they were last written from the same stage output. The columns in
+        categorical are held as categories of their text in the store, as
+        when the CSV is read by dataset.py.
+        """
+        outputs_path = os.path.join(self.cache_dir, 'outputs.json')
+        outputs = read_json(outputs_path)
+        store = columnar.store_path(path)
+        if (not self.force and outputs.get(path)==stage.key and os.path.exists(path)
+                and columnar.is_current(store, path)):
+            self._print('current  {}'.format(path))
+            return False
+
+        stage.frame.to_csv(path + '.tmp', index=False)
+        os.replace(path + '.tmp', path)
+        columnar.write_table(stage.frame, store, categorical=categorical, source=columnar.source_fingerprint(path))
+        outputs[path] = stage.key
+        write_json(outputs_path, outputs)
+        self._print('wrote    {} and {}'.format(path, store))
+        return True
+
+    def _print(self, message):
+        if self.log:
+            print(message, file=self.log)
+
+
+def build(sources, data_dir, cache_dir, force=False, log=sys.stderr):
+    """Run the stages whose inputs changed and write the outputs that changed."""
+    pipeline = Pipeline(cache_dir, force=force, log=log)
+
+    ew = pipeline.stage('ew_centroids', read_ew_centroids, sources['ew_centroids'])
+    scotland = pipeline.stage('scotland_centroids', read_scotland_centroids, sources['scotland_centroids'])
+    ni = pipeline.stage('ni_centroids', read_ni_centroids, sources['ni_areas'])
+    centroids = pipeline.stage('centroids', combine_centroids, ew, scotland, ni)
+    areas = pipeline.stage('areas', join_areas, sources['index'], centroids)
+    retailers = pipeline.stage('retailers', clean_retail_points, sources['retail_points'])
+
+    os.makedirs(data_dir, exist_ok=True)
+    pipeline.write(areas, os.path.join(data_dir, AREAS_FILE), categorical=DECILE_COLUMNS)
+    pipeline.write(retailers, os.path.join(data_dir, RETAILERS_FILE), categorical=RETAILER_CATEGORIES)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--source-dir', default='/data', help='directory of the downloaded source data')
+    parser.add_argument('--data-dir', default='/app/data', help='directory to write the explorer data files to')
+    parser.add_argument('--cache-dir', help='directory for the stage cache (.build_cache in the source directory by default)')
+    for name, filename in SOURCES.items():
+        parser.add_argument('--' + name.replace('_', '-'), help='path of the {} file (default {})'.format(name, filename))
+    parser.add_argument('--force', action='store_true', help='run every stage and write every output')
+    args = parser.parse_args()
+
+    sources = {name: getattr(args, name) or os.path.join(args.source_dir, filename)
+               for name, filename in SOURCES.items()}
+    start = time.perf_counter()
+    try:
+        build(sources, args.data_dir, args.cache_dir or os.path.join(args.source_dir, '.build_cache'),
+              force=args.force)
+    except ValidationError as e:
+        print('Validation failed: {}'.format(e), file=sys.stderr)
+        sys.exit(1)
+    print('Done in {:.1f}s'.format(time.perf_counter() - start))
+
+
+if __name__=="__main__":
+    main()
@@ -0,0 +1,49 @@
+import argparse
+import gzip
+import os
+
+import plotly.io as pio
+
+from dataset import AREAS_FILE, DECILE_COLUMNS, RETAILERS_FILE, load_dataset
+from figures import build_figure, regroup_update, retailer_update
+
+"""
+Compares the size of the response sent to the browser for each map interaction
+when the whole figure is re-sent against the partial update which is sent instead.
+
+Run from the repository root with: python -m scripts.payload_sizes --data-dir data
+"""
+
+
+def sizes(payload):
+    raw = pio.to_json(payload, validate=False).encode()
+    return len(raw), len(gzip.compress(raw))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--data-dir', default='data')
+    args = parser.parse_args()
+
+    dataset = load_dataset(os.path.join(args.data_dir, AREAS_FILE), os.path.join(args.data_dir, RETAILERS_FILE))
+    areas, retailers = dataset.areas, dataset.retailers
+
+    print('{:<66} {:>12} {:>12} {:>12} {:>12}'.format('interaction', 'full (kB)', 'full gz', 'update', 'update gz'))
+    rows = []
+    for domain in DECILE_COLUMNS:
+        for show_retailers in (False, True):
+            rows.append(('domain -> {} (retailers {})'.format(domain, 'on' if show_retailers else 'off'),
+                         build_figure(areas, retailers, domain, show_retailers),
+                         regroup_update(areas, domain)))
+    for show_retailers in (True, False):
+        rows.append(('retailers -> {}'.format('on' if show_retailers else 'off'),
+                     build_figure(areas, retailers, 'pp_dec_combined', show_retailers),
+                     retailer_update(retailers, show_retailers)))
+
+    for name, figure, update in rows:
+        print('{:<66} {:>12.0f} {:>12.0f} {:>12.0f} {:>12.0f}'.format(
+            name, *[size / 1000 for size in sizes(figure) + sizes(update)]))
+
+
+if __name__=="__main__":
+    main()
@@ -0,0 +1,215 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from dataset import AREAS_FILE, DECILE_COLUMNS, RETAILERS_FILE, load_dataset
+from figures import HIDDEN_DECILES, build_figure, fit_bounds, view_bounds
+from retailer_filter import filtered_retailers
+from scripts.state import code_version, read_json, write_json
+
+"""
+Renders static images of the explorer's map in batches. Each job in the
+manifest gives the domain, the view (a centre and zoom, or a bounding box),
+whether to show the retailers, which of them to show (retailer and size
+filter values as in the app, all by default), the image size and the output
+file:
+
+    {"defaults": {"width": 1500, "height": 800, "scale": 4.0},
+     "jobs": [{"output": "output_images/leeds_{domain}.png", "domains": "all",
+               "center": {"lat": 53.8067, "lon": -1.5550}, "zoom": 9},
+              {"output": "output_images/cardiff.pdf", "domain": "pp_dec_combined", "retailers": true,
+               "retailer_filter": ["group:Discounters"], "size_filter": ["Large", "Very large"],
+               "bounds": {"south": 51.4, "west": -3.35, "north": 51.56, "east": -3.05}}]}
+
+A job with "domains" (a list, or "all") is repeated for each of them, with
+{domain} in the output replaced by the domain. The data is loaded once and the
+figures are built with the same code as the app, then rendered with kaleido
+across a pool of processes. Jobs whose output already exists and was rendered
+from the same job, data and figure code are skipped. Run from the repository root:
+
+    python -m scripts.render_maps manifest.json --data-dir data
+"""
+
+JOB_DEFAULTS = {'domain': 'pp_dec_combined', 'retailers': False, 'retailer_filter': [], 'size_filter': [],
+                'width': 1500, 'height': 800, 'scale': 4.0}
+FORMATS = ['png', 'jpeg', 'webp', 'svg', 'pdf']
+
+# Source files whose changes alter the rendered images
+CODE_FILES = ['figures.py', 'retailer_filter.py', 'scripts/render_maps.py']
+
+# Share of the view added on each side when selecting the points to draw
+VIEW_MARGIN = 0.1
+
+
+def expand_jobs(manifest):
+    """Jobs of a manifest with the defaults filled in, one per domain."""
+    if isinstance(manifest, list):
+        manifest = {'jobs': manifest}
+    jobs = []
+    for job in manifest['jobs']:
+        job = dict(JOB_DEFAULTS, **manifest.get('defaults', {}), **job)
+        domains = job.pop('domains', None)
+        if domains is None:
+            jobs.append(job)
+            continue
+        for domain in (DECILE_COLUMNS if domains=='all' else domains):
+            jobs.append(dict(job, domain=domain, output=job['output'].format(domain=domain)))
+
+    for job in jobs:
+        if job['domain'] not in DECILE_COLUMNS:
+            raise ValueError('Unknown domain {} for {}'.format(job['domain'], job['output']))
+        for name in ('retailer_filter', 'size_filter'):
+            if not isinstance(job[name], list):
+                raise ValueError('{} of {} must be a list'.format(name, job['output']))
+        if ('bounds' in job)==('center' in job):
+            raise ValueError('{} needs either a center and zoom or bounds'.format(job['output']))
+        job.setdefault('format', os.path.splitext(job['output'])[1].lstrip('.').lower().replace('jpg', 'jpeg'))
+        if job['format'] not in FORMATS:
+            raise ValueError('Unknown image format {} for {}'.format(job['format'], job['output']))
+
+    outputs = [job['output'] for job in jobs]
+    if len(set(outputs)) < len(outputs):
+        raise ValueError('Several jobs write to the same output file')
+    return jobs
+
+
+def job_figure(dataset, job):
+    if 'bounds' in job:
+        center, zoom = fit_bounds(job['bounds'], job['width'], job['height'])
+    else:
+        center, zoom = job['center'], job['zoom']
+    south, west, north, east = view_bounds(center, zoom, job['width'], job['height'])
+
+    # Only the points in and around the view are drawn, which is most of the rendering time
+    margin_lat, margin_lon = (north - south) * VIEW_MARGIN, (east - west) * VIEW_MARGIN
+    areas = dataset.areas
+    retailers = filtered_retailers(dataset, job['retailer_filter'], job['size_filter'])
+    areas = areas[areas['latitude'].between(south - margin_lat, north + margin_lat) &
+                  areas['longitude'].between(west - margin_lon, east + margin_lon)]
+    retailers = retailers[retailers['lat_wgs'].between(south - margin_lat, north + margin_lat) &
+                          retailers['long_wgs'].between(west - margin_lon, east + margin_lon)]
+
+    # Stores are coloured by size as in the app
+    fig = build_figure(areas, retailers, job['domain'], job['retailers'], center=center, zoom=zoom, by_size=True)
+    # Every decile is shown in the images rather than only the first as in the app
+    fig.update_traces(visible=True, selector=lambda trace: trace.meta!='retailers' and trace.name not in HIDDEN_DECILES)
+    fig.update_layout(width=job['width'], height=job['height'])
+    return fig
+
+
+def job_key(job, dataset_version, code):
+    return hashlib.sha1(json.dumps([job, dataset_version, code], sort_keys=True).encode()).hexdigest()
+
+
+def output_stat(path):
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def is_unchanged(job, key, state):
+    # Rendered before from the same inputs, and the file has not been touched since
+    entry = state.get(job['output'])
+    return (entry is not None and entry['key']==key and os.path.exists(job['output'])
+            and output_stat(job['output'])==entry['output'])
+
+
+_dataset = None
+
+
+def _init_worker(data_dir):
+    # With fork the dataset loaded by the parent is inherited, otherwise load it here
+    global _dataset
+    if _dataset is None:
+        _dataset = load_dataset(os.path.join(data_dir, AREAS_FILE), os.path.join(data_dir, RETAILERS_FILE))
+
+
+def render_job(job):
+    start = time.perf_counter()
+    fig = job_figure(_dataset, job)
+    build_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if os.path.dirname(job['output']):
+        os.makedirs(os.path.dirname(job['output']), exist_ok=True)
+    fig.write_image(job['output'], format=job['format'], scale=job['scale'],
+                    width=job['width'], height=job['height'])
+    render_seconds = time.perf_counter() - start
+
+    return {'build_seconds': build_seconds, 'render_seconds': render_seconds, 'pid': os.getpid()}
+
+
+def render(jobs, data_dir, processes=None, state_path=None, force=False, log=sys.stderr):
+    """
+    Render the jobs, skipping those already rendered from the same inputs
+    according to the state file. Returns the timing of every job.
+    """
+    global _dataset
+    start = time.perf_counter()
+    _init_worker(data_dir)
+    load_seconds = time.perf_counter() - start
+
+    code = code_version(CODE_FILES)
+    state = {} if state_path is None else read_json(state_path)
+    keys = [job_key(job, _dataset.version, code) for job in jobs]
+
+    results = []
+    pending = []
+    for job, key in zip(jobs, keys):
+        if not force and is_unchanged(job, key, state):
+            results.append({'output': job['output'], 'status': 'skipped'})
+        else:
+            pending.append((job, key))
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=min(processes or os.cpu_count() or 1, len(pending)),
+                                 initializer=_init_worker, initargs=(data_dir,)) as pool:
+            futures = {pool.submit(render_job, job): (job, key) for job, key in pending}
+            for future in as_completed(futures):
+                job, key = futures[future]
+                try:
+                    result = dict(future.result(), output=job['output'], status='rendered')
+                except Exception as e:
+                    result = {'output': job['output'], 'status': 'failed', 'error': repr(e)}
+                else:
+                    state[job['output']] = {'key': key, 'output': output_stat(job['output'])}
+                    if state_path is not None:
+                        write_json(state_path, state)
+                results.append(result)
+                if log:
+                    print('{status:<8} {output}'.format(**result) +
+                          (' (build {build_seconds:.2f}s, render {render_seconds:.2f}s)'.format(**result)
+                           if result['status']=='rendered' else ' ' + result.get('error', '')), file=log)
+
+    return {'load_seconds': load_seconds, 'total_seconds': time.perf_counter() - start, 'jobs': results}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('manifest', help='JSON file listing the images to render')
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--processes', type=int, help='rendering processes (one per CPU by default)')
+    parser.add_argument('--force', action='store_true', help='render every job even if unchanged')
+    parser.add_argument('--report', help='file to write the timing of every job to as JSON')
+    args = parser.parse_args()
+
+    with open(args.manifest) as f:
+        jobs = expand_jobs(json.load(f))
+
+    report = render(jobs, args.data_dir, processes=args.processes, force=args.force,
+                    state_path=os.path.splitext(args.manifest)[0] + '.state.json')
+
+    counts = {status: sum(job['status']==status for job in report['jobs']) for status in ('rendered', 'skipped', 'failed')}
+    print('{rendered} rendered, {skipped} skipped, {failed} failed in {0:.1f}s'.format(report['total_seconds'], **counts))
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=1)
+    if counts['failed']:
+        sys.exit(1)
+
+
+if __name__=="__main__":
+    main()
@@ -0,0 +1,33 @@
+import hashlib
+import json
+import os
+
+"""
+State kept between runs by the scripts that skip work already done
+(build_data.py, render_maps.py): JSON files written atomically, and a hash of
+the source files whose changes make that work stale.
+"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def code_version(paths):
+    # Hash of the source files at paths, relative to the repository root
+    digest = hashlib.sha1()
+    for path in paths:
+        with open(os.path.join(ROOT, path), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def read_json(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_json(path, data):
+    with open(path + '.tmp', 'w') as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+    os.replace(path + '.tmp', path)
@@ -0,0 +1,137 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from dataset import AREAS_FILE, DECILE_COLUMNS, LABEL_COLUMNS, RETAILERS_FILE
+
+"""
+Generates synthetic data files with the same columns and value formats as
+priority_places_Oct2022_WGS.csv and retail_locations_glxv24_202206.csv, at any
+number of rows, so that the explorer can be run and benchmarked without the
+real data. Points are clustered around the larger towns of each country, and
+Northern Ireland areas have no score for the domains it is not covered by.
+
+Run from the repository root with:
+
+    python -m scripts.synthetic_data --data-dir /tmp/synthetic --areas 1000000
+"""
+
+# Number of rows in the real files
+AREAS_ROWS = 42619
+RETAILERS_ROWS = 17494
+
+# Geo code prefix, share of the areas and (name, lat, lon, weight) of the towns of each country
+COUNTRIES = [
+    ('E01', 0.771, [('London', 51.51, -0.13, 9), ('Birmingham', 52.48, -1.90, 3), ('Manchester', 53.48, -2.24, 3),
+                    ('Leeds', 53.80, -1.55, 2), ('Liverpool', 53.41, -2.98, 2), ('Newcastle', 54.98, -1.61, 2),
+                    ('Bristol', 51.45, -2.59, 1), ('Nottingham', 52.95, -1.15, 1), ('Sheffield', 53.38, -1.47, 1),
+                    ('Norwich', 52.63, 1.30, 1), ('Plymouth', 50.38, -4.14, 1), ('Southampton', 50.90, -1.40, 1)]),
+    ('W01', 0.045, [('Cardiff', 51.48, -3.18, 3), ('Swansea', 51.62, -3.94, 2), ('Wrexham', 53.05, -3.00, 1),
+                    ('Aberystwyth', 52.41, -4.08, 1)]),
+    ('S01', 0.163, [('Glasgow', 55.86, -4.25, 4), ('Edinburgh', 55.95, -3.19, 3), ('Aberdeen', 57.15, -2.09, 1),
+                    ('Dundee', 56.46, -2.97, 1), ('Inverness', 57.48, -4.22, 1)]),
+    ('95', 0.021, [('Belfast', 54.60, -5.93, 3), ('Derry', 55.00, -7.31, 1), ('Omagh', 54.60, -7.30, 1)]),
+]
+
+# Spread (degrees) of the points around each town, and share of points scattered more widely
+TOWN_SPREAD = 0.15
+RURAL_SPREAD = 0.8
+RURAL_SHARE = 0.3
+
+RETAILERS = ['Tesco', 'The Co-operative Group', 'Spar', 'Sainsburys', 'Marks and Spencer', 'Iceland', 'Aldi',
+             'Lidl', 'Morrisons', 'Asda', 'Waitrose', 'Farmfoods', 'Heron', 'Budgens', 'Costco', 'Booths']
+RETAILER_WEIGHTS = [2787, 2674, 2497, 1408, 1058, 1009, 968, 962, 883, 637, 356, 343, 281, 279, 29, 28]
+
+SIZES = [('< 3,013 ft2 (280m2)', 'Small convenience', 9125),
+         ('3,013 < 15,069 ft2 (280 < 1,400 m2)', 'Mid-size', 5662),
+         ('15,069 < 30,138 ft2 (1,400 < 2,800 m2)', 'Large', 1284),
+         ('30,138 ft2 > (2,800 m2)', 'Very large', 1423)]
+
+
+def _weights(values):
+    values = np.asarray(values, dtype=np.float64)
+    return values / values.sum()
+
+
+def _points(rng, n, towns):
+    # Positions clustered around the towns, with a share spread out into the countryside
+    town = rng.choice(len(towns), size=n, p=_weights([t[3] for t in towns]))
+    spread = np.where(rng.random(n) < RURAL_SHARE, RURAL_SPREAD, TOWN_SPREAD)
+    lat = np.array([t[1] for t in towns])[town] + rng.normal(0, 1, n) * spread
+    lon = np.array([t[2] for t in towns])[town] + rng.normal(0, 1, n) * spread * 1.6
+    return town, lat, lon
+
+
+def generate_areas(rows=AREAS_ROWS, seed=0):
+    rng = np.random.default_rng(seed)
+    counts = rng.multinomial(rows, _weights([share for _, share, _ in COUNTRIES]))
+
+    frames = []
+    for (prefix, _, towns), n in zip(COUNTRIES, counts):
+        town, lat, lon = _points(rng, n, towns)
+        numbers = np.arange(n)
+        if prefix=='95':
+            # Northern Ireland Small Areas have codes like 95AA01S1
+            letters = np.array([chr(65 + i) for i in range(26)])
+            codes = ['95{}{}{:02d}S{}'.format(a, b, c, d) for a, b, c, d in
+                     zip(letters[numbers // 26 % 26], letters[numbers % 26], numbers // 676 % 100, numbers // 67600 + 1)]
+        else:
+            codes = ['{}{:06d}'.format(prefix, i) for i in numbers]
+        names = np.array([t[0] for t in towns])[town]
+        df = pd.DataFrame({'geo_code': codes,
+                           'geo_label': ['{} {:03d}{}'.format(name, i % 1000, chr(65 + i % 26))
+                                         for name, i in zip(names, numbers)],
+                           'longitude': lon,
+                           'latitude': lat})
+        for column in DECILE_COLUMNS:
+            df[column] = rng.integers(1, 11, n)
+            if prefix=='95' and column in LABEL_COLUMNS.values():
+                df[column] = 0
+        frames.append(df)
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def generate_retailers(rows=RETAILERS_ROWS, seed=0):
+    rng = np.random.default_rng(seed + 1)
+    towns = [town for _, share, country in COUNTRIES for town in
+             [(name, lat, lon, weight * share) for name, lat, lon, weight in country]]
+    _, lat, lon = _points(rng, rows, towns)
+    size = rng.choice(len(SIZES), size=rows, p=_weights([s[2] for s in SIZES]))
+    return pd.DataFrame({'id': 1010000001 + rng.permutation(rows),
+                         'retailer': rng.choice(RETAILERS, size=rows, p=_weights(RETAILER_WEIGHTS)),
+                         'long_wgs': lon.round(8),
+                         'lat_wgs': lat.round(8),
+                         'size_band': np.array([s[0] for s in SIZES])[size],
+                         'size_code': np.array([s[1] for s in SIZES])[size]})
+
+
+def write_dataset(data_dir, areas_rows=AREAS_ROWS, retailers_rows=None, seed=0):
+    """
+    Write both data files to data_dir. Without retailers_rows, the number of
+    retailers keeps the same ratio to the number of areas as the real files.
+    """
+    if retailers_rows is None:
+        retailers_rows = round(areas_rows * RETAILERS_ROWS / AREAS_ROWS)
+    os.makedirs(data_dir, exist_ok=True)
+    # The areas file has an unnamed index column, the retailers file does not
+    generate_areas(areas_rows, seed).to_csv(os.path.join(data_dir, AREAS_FILE))
+    generate_retailers(retailers_rows, seed).to_csv(os.path.join(data_dir, RETAILERS_FILE), index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--data-dir', required=True)
+    parser.add_argument('--areas', type=int, default=AREAS_ROWS, help='number of areas')
+    parser.add_argument('--retailers', type=int, help='number of retailers (scaled with the areas by default)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    write_dataset(args.data_dir, args.areas, args.retailers, args.seed)
+    print('Wrote {} and {} to {}'.format(AREAS_FILE, RETAILERS_FILE, args.data_dir))
+
+
+if __name__=="__main__":
+    main()
@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+
+from regions import ALL, region_slices
+
+"""
+Search for areas by geo_code or geo_label. Both are held in sorted prefix
+indexes built on first use for each loaded dataset, so the areas starting with
+any text are found with two binary searches. Labels are also indexed from the
+start of each word, so 'london' finds 'City of London 001A'.
+"""
+
+MAX_RESULTS = 10
+
+
+class PrefixIndex:
+
+    def __init__(self, keys, rows):
+        keys = np.asarray(keys, dtype=str)
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.rows = np.asarray(rows, dtype=np.int64)[order]
+
+    def rows_with_prefix(self, prefix):
+        # The prefix is given the dtype of the keys, as searching with any other
+        # string length would copy the whole array
+        width = self.keys.dtype.itemsize // 4
+        if len(prefix) > width:
+            return self.rows[:0]
+        start = np.searchsorted(self.keys, np.array(prefix, dtype=self.keys.dtype), side='left')
+        if len(prefix)==width:
+            stop = np.searchsorted(self.keys, np.array(prefix, dtype=self.keys.dtype), side='right')
+        else:
+            stop = np.searchsorted(self.keys, np.array(prefix + '\U0010ffff', dtype=self.keys.dtype), side='left')
+        return self.rows[start:stop]
+
+
+def first_kept(rows, keep, limit):
+    # The first limit rows passing keep, checked in growing chunks rather than all at once
+    kept = []
+    found = 0
+    start, size = 0, limit
+    while start < len(rows) and found < limit:
+        chunk = rows[start:start + size]
+        kept.append(chunk[keep(chunk)])
+        found += len(kept[-1])
+        start += size
+        size *= 4
+    return np.concatenate(kept)[:limit] if kept else rows[:0]
+
+
+class AreaSearch:
+
+    def __init__(self, dataset):
+        areas = dataset.areas
+        # Missing codes and labels are left out rather than found as 'nan'
+        self.codes = PrefixIndex(areas['geo_code'].fillna('').astype(str).str.lower(), np.arange(len(areas)))
+
+        # Every word of a label starts a key running to the end of the label
+        keys, rows = [], []
+        for row, label in enumerate(areas['geo_label'].fillna('').astype(str).str.lower()):
+            words = label.split()
+            for i in range(len(words)):
+                keys.append(' '.join(words[i:]))
+                rows.append(row)
+        self.labels = PrefixIndex(keys, rows)
+
+    def search(self, text, limit=MAX_RESULTS, keep=None):
+        """
+        Rows of the areas whose code or label starts with text, codes first.
+        keep(rows) can narrow the matches down, returning a mask.
+        """
+        text = ' '.join(text.lower().split())
+        if not text:
+            return np.empty(0, dtype=np.int64)
+        matches = []
+        for index in (self.codes, self.labels):
+            rows = index.rows_with_prefix(text)
+            matches.append(rows[:limit] if keep is None else first_kept(rows, keep, limit))
+        return pd.unique(np.concatenate(matches))[:limit]
+
+
+def area_search(dataset):
+    return dataset.derived('area_search', AreaSearch)
+
+
+def search_areas(dataset, text, region=ALL, limit=MAX_RESULTS):
+    if region==ALL:
+        return area_search(dataset).search(text, limit)
+    slices = region_slices(dataset)
+    return area_search(dataset).search(text, limit, keep=lambda rows: slices.contains(region, rows))
@@ -0,0 +1,182 @@
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+"""
+Spatial indexing of the area centroids and retailer locations. PointGrid
+buckets points into a regular latitude/longitude grid and sorts them by cell,
+so that the points of any rectangle of cells are found with a binary search
+per grid row rather than a scan over every point. StoreIndex and AreaIndex
+answer nearest neighbour and radius queries with KD-trees.
+"""
+
+# Bounding box covering the UK, points outside it are clipped to the edge cells
+UK_BOUNDS = {'south': 49.0, 'west': -9.0, 'north': 61.5, 'east': 2.5}
+
+
+def concatenate_ranges(starts, stops):
+    # Equivalent to np.concatenate([np.arange(a, b) for a, b in zip(starts, stops)])
+    lengths = np.maximum(stops - starts, 0)
+    total = lengths.sum()
+    if total==0:
+        return np.empty(0, dtype=np.int64)
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return offsets + np.arange(total)
+
+
+class PointGrid:
+
+    def __init__(self, lat, lon, cell_size, bounds=UK_BOUNDS):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.cell_size = cell_size
+        self.bounds = bounds
+        self.nrows = int(np.ceil((bounds['north'] - bounds['south']) / cell_size))
+        self.ncols = int(np.ceil((bounds['east'] - bounds['west']) / cell_size))
+
+        cells = self.cell_ids(self.lat, self.lon)
+        self.order = np.argsort(cells, kind='stable')
+        sorted_cells = cells[self.order]
+
+        # Non-empty cells and the slice of self.order holding each one's points
+        self.cells, starts = np.unique(sorted_cells, return_index=True)
+        self.starts = np.append(starts, len(sorted_cells))
+        self.point_cell = np.empty(len(cells), dtype=np.int64)
+        self.point_cell[self.order] = np.repeat(np.arange(len(self.cells)), np.diff(self.starts))
+
+    def _row_col(self, lat, lon):
+        row = np.clip(((lat - self.bounds['south']) / self.cell_size).astype(np.int64), 0, self.nrows - 1)
+        col = np.clip(((lon - self.bounds['west']) / self.cell_size).astype(np.int64), 0, self.ncols - 1)
+        return row, col
+
+    def cell_ids(self, lat, lon):
+        row, col = self._row_col(np.asarray(lat), np.asarray(lon))
+        return row * self.ncols + col
+
+    def query_cells(self, south, west, north, east):
+        """Positions in self.cells of the non-empty cells overlapping the rectangle."""
+        (row0, row1), (col0, col1) = self._row_col(np.array([south, north]), np.array([west, east]))
+        rows = np.arange(row0, row1 + 1)
+        first = np.searchsorted(self.cells, rows * self.ncols + col0, side='left')
+        last = np.searchsorted(self.cells, rows * self.ncols + col1, side='right')
+        return concatenate_ranges(first, last)
+
+    def count(self, south, west, north, east):
+        """
+        (at least, at most) the number of points inside the rectangle, from
+        the number of points in the cells wholly inside it and in every cell
+        overlapping it, without looking at the points themselves.
+        """
+        cells = self.query_cells(south, west, north, east)
+        sizes = self.starts[cells + 1] - self.starts[cells]
+        row, col = np.divmod(self.cells[cells], self.ncols)
+        cell_south = self.bounds['south'] + row * self.cell_size
+        cell_west = self.bounds['west'] + col * self.cell_size
+        inside = ((cell_south >= south) & (cell_south + self.cell_size <= north) &
+                  (cell_west >= west) & (cell_west + self.cell_size <= east))
+        return int(sizes[inside].sum()), int(sizes.sum())
+
+    def query(self, south, west, north, east):
+        """Indices of the points inside the rectangle, in their original order."""
+        cells = self.query_cells(south, west, north, east)
+        points = self.order[concatenate_ranges(self.starts[cells], self.starts[cells + 1])]
+        inside = ((self.lat[points] >= south) & (self.lat[points] <= north) &
+                  (self.lon[points] >= west) & (self.lon[points] <= east))
+        return np.sort(points[inside])
+
+    def aggregate(self, codes, ncodes):
+        """
+        Count of points with each code in every non-empty cell, with the mean
+        position of the points in the cell. Returns (lat, lon, counts) with one
+        row per cell in self.cells.
+        """
+        counts = np.bincount(self.point_cell * ncodes + codes,
+                             minlength=len(self.cells) * ncodes).reshape(len(self.cells), ncodes)
+        size = np.diff(self.starts)
+        lat = np.bincount(self.point_cell, weights=self.lat) / size
+        lon = np.bincount(self.point_cell, weights=self.lon) / size
+        return lat, lon, counts
+
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Size codes of the Geolytix stores counted as large grocery stores
+LARGE_SIZES = ['Large', 'Very large']
+
+
+def unit_vectors(lat, lon):
+    """
+    Points on the unit sphere. Straight line (chord) distance between them
+    orders points the same as great circle distance, so a KD-tree over these
+    gives exact nearest neighbours anywhere on the globe.
+    """
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+def chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord) / 2, 0, 1))
+
+
+def km_to_chord(km):
+    return 2 * np.sin(np.asarray(km) / (2 * EARTH_RADIUS_KM))
+
+
+class StoreIndex:
+    """
+    KD-trees over the retailer locations: one over every store, one per size
+    code and one over the large stores, answering batches of queries at once.
+    """
+
+    def __init__(self, lat, lon, size_codes):
+        points = unit_vectors(lat, lon)
+        size_codes = np.asarray(size_codes, dtype=str)
+        self.tree = cKDTree(points)
+        self.sizes = {}
+        for size in pd.unique(size_codes):
+            self.sizes[size] = cKDTree(points[size_codes==size])
+        large = np.flatnonzero(np.isin(size_codes, LARGE_SIZES))
+        self.large_tree = cKDTree(points[large])
+        self.large_rows = large
+
+    def nearest(self, lat, lon, k=5):
+        """
+        Distances (km) and rows of the k nearest stores to each point, both
+        shaped (n, k), with fewer than k columns if there are fewer stores.
+        """
+        k = min(k, self.tree.n)
+        if k==0:
+            n = len(np.atleast_1d(lat))
+            return np.empty((n, 0)), np.empty((n, 0), dtype=np.int64)
+        chord, rows = self.tree.query(unit_vectors(lat, lon), k=k)
+        return chord_to_km(chord).reshape(-1, k), rows.reshape(-1, k)
+
+    def count_within(self, lat, lon, radius_km):
+        """Number of stores of each size code within radius_km of each point."""
+        points = unit_vectors(lat, lon)
+        return {size: tree.query_ball_point(points, km_to_chord(radius_km), return_length=True)
+                for size, tree in self.sizes.items()}
+
+    def nearest_large(self, lat, lon):
+        """Distance (km) and row of the nearest large store to each point."""
+        if self.large_tree.n==0:
+            return np.full(len(np.atleast_1d(lat)), np.inf), np.full(len(np.atleast_1d(lat)), -1)
+        chord, index = self.large_tree.query(unit_vectors(lat, lon), k=1)
+        return chord_to_km(chord), self.large_rows[index]
+
+
+class AreaIndex:
+    """Lookup of the areas by geo_code and of the area with the nearest centroid to a point."""
+
+    def __init__(self, geo_codes, lat, lon):
+        self.codes = pd.Index(geo_codes)
+        self.tree = cKDTree(unit_vectors(lat, lon))
+
+    def rows(self, geo_codes):
+        # Row of each geo_code, -1 where it is not found
+        return self.codes.get_indexer(geo_codes)
+
+    def nearest(self, lat, lon):
+        chord, rows = self.tree.query(unit_vectors(lat, lon), k=1)
+        return chord_to_km(chord), rows
@@ -0,0 +1,36 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from dataset import AREAS_FILE, DECILE_COLUMNS, DatasetRegistry
+from scripts.synthetic_data import write_dataset
+
+"""
+Fixtures shared by the tests: a small synthetic data directory with two index
+releases, the second made from the first with some deciles changed.
+"""
+
+AREAS_ROWS = 2000
+OLD_RELEASE = 'Oct2021'
+NEW_RELEASE = 'Oct2022'
+
+
+@pytest.fixture(scope='session')
+def data_dir(tmp_path_factory):
+    data_dir = str(tmp_path_factory.mktemp('data'))
+    write_dataset(data_dir, AREAS_ROWS)
+    areas = pd.read_csv(os.path.join(data_dir, AREAS_FILE), index_col=0)
+    rng = np.random.default_rng(1)
+    for column in DECILE_COLUMNS:
+        # A third of the areas move by up to 3 deciles, within 1 to 10
+        moved = (rng.random(len(areas)) < 1 / 3) & (areas[column] > 0)
+        areas.loc[moved, column] = np.clip(areas.loc[moved, column] + rng.integers(-3, 4, moved.sum()), 1, 10)
+    areas.to_csv(os.path.join(data_dir, AREAS_FILE.replace(NEW_RELEASE, OLD_RELEASE)))
+    return data_dir
+
+
+@pytest.fixture
+def registry(data_dir):
+    return DatasetRegistry(data_dir)
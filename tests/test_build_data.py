@@ -0,0 +1,28 @@
+import pandas as pd
+import pytest
+
+from dataset import DECILE_COLUMNS
+from scripts.build_data import ValidationError, join_areas
+
+
+def _index(tmp_path, codes):
+    path = str(tmp_path / 'index.csv')
+    pd.DataFrame({column: 1 for column in DECILE_COLUMNS}, index=pd.Index(codes, name='geo_code')).to_csv(path)
+    return path
+
+
+def _centroids(codes):
+    return pd.DataFrame({'geo_code': codes, 'geo_label': codes,
+                         'longitude': -1.5, 'latitude': 53.8})
+
+
+def test_join_areas(tmp_path):
+    areas = join_areas(_index(tmp_path, ['E01000001', 'S01000001']), _centroids(['E01000001', 'S01000001', 'W01000001']))
+    assert areas['geo_code'].tolist()==['E01000001', 'S01000001']
+    assert list(areas.columns)==['geo_code', 'geo_label', 'longitude', 'latitude'] + DECILE_COLUMNS
+
+
+def test_join_areas_unmatched(tmp_path):
+    index = _index(tmp_path, ['E01000001', 'E01000002', 'E01000003', 'S01000001', '95AA01S1'])
+    with pytest.raises(ValidationError, match=r'3 areas .*\(2 in England, 1 in Northern Ireland\), such as E01000002'):
+        join_areas(index, _centroids(['E01000001', 'S01000001']))
@@ -0,0 +1,43 @@
+import json
+from types import SimpleNamespace
+
+from cache import FigureCache
+
+
+def _cache(builds, **kwargs):
+    def build(dataset, *args):
+        builds.append(args)
+        return {'data': [{'name': str(args)}], 'layout': {}}
+    return FigureCache(build, lambda *args: {'update': args[0], 'domain': '', 'retailers': ''}, **kwargs)
+
+
+def test_figures_are_sent_as_cached_json():
+    builds = []
+    cache = _cache(builds)
+    dataset = SimpleNamespace(version='v1')
+    text = cache.get_json(dataset, 'figure', 'a')
+    assert json.loads(text)=={'data': [{'name': "('figure', 'a')"}], 'layout': {}}
+    assert cache.get_json(dataset, 'figure', 'a')==text
+    assert cache.get(dataset, 'figure', 'a')==json.loads(text)
+    assert builds==[('figure', 'a')]
+
+
+def test_cache_is_bounded():
+    builds = []
+    cache = _cache(builds, max_bytes=60)
+    dataset = SimpleNamespace(version='v1')
+    cache.get_json(dataset, 'figure', 'a')
+    cache.get_json(dataset, 'figure', 'b')
+    # Only one figure fits in the budget, so a is built again
+    cache.get_json(dataset, 'figure', 'a')
+    assert builds==[('figure', 'a'), ('figure', 'b'), ('figure', 'a')]
+    assert cache._cache.nbytes <= 60
+
+
+def test_retain_drops_figures():
+    builds = []
+    cache = _cache(builds)
+    cache.warm(SimpleNamespace(version='v1'), [('figure', 'a')])
+    cache.retain({'v2'})
+    cache.get_json(SimpleNamespace(version='v1'), 'figure', 'a')
+    assert builds==[('figure', 'a'), ('figure', 'a')]
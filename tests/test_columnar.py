@@ -0,0 +1,68 @@
+import json
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import columnar
+
+
+def _table():
+    return pd.DataFrame({'geo_code': ['E01000001', None, 'S01000001', ''],
+                         'geo_label': ['Leeds 001A', 'Ynys Môn 002B', np.nan, 'Fife'],
+                         'decile': pd.Categorical(['1', '10', None, '1']),
+                         'latitude': [53.8, np.nan, 56.2, 51.5],
+                         'id': [4, 3, 2, 1]})
+
+
+def _check(table, loaded):
+    assert list(loaded.columns)==list(table.columns)
+    for name in ('geo_code', 'geo_label'):
+        assert loaded[name].isna().tolist()==table[name].isna().tolist()
+        assert loaded[name].dropna().tolist()==table[name].dropna().tolist()
+    assert loaded['decile'].isna().tolist()==[False, False, True, False]
+    assert loaded['decile'].dropna().tolist()==['1', '10', '1']
+    np.testing.assert_allclose(loaded['latitude'], table['latitude'], rtol=1e-6)
+    assert loaded['id'].tolist()==[4, 3, 2, 1]
+
+
+def test_round_trip(tmp_path):
+    table = _table()
+    columnar.write_table(table, str(tmp_path / 'table.columns'))
+    loaded = columnar.read_table(str(tmp_path / 'table.columns'))
+    _check(table, loaded)
+    assert columnar.read_meta(str(tmp_path / 'table.columns'))['version']==columnar.FORMAT_VERSION
+
+
+def test_round_trip_without_pyarrow(tmp_path, monkeypatch):
+    table = _table()
+    columnar.write_table(table, str(tmp_path / 'table.columns'))
+    monkeypatch.setitem(sys.modules, 'pyarrow', None)
+    loaded = columnar.read_table(str(tmp_path / 'table.columns'))
+    _check(table, loaded)
+    assert loaded['geo_code'].dtype==object
+
+
+def test_empty_table(tmp_path):
+    columnar.write_table(_table().iloc[:0], str(tmp_path / 'table.columns'))
+    assert len(columnar.read_table(str(tmp_path / 'table.columns')))==0
+
+
+def test_older_stores_are_rebuilt(tmp_path):
+    csv_path = str(tmp_path / 'table.csv')
+    _table().to_csv(csv_path, index=False)
+    store = columnar.build_store(csv_path, pd.read_csv)
+    assert columnar.is_current(store, csv_path)
+
+    meta = columnar.read_meta(store)
+    meta['version'] = 1
+    with open(str(tmp_path / 'table.columns' / columnar.META_FILE), 'w') as f:
+        json.dump(meta, f)
+    assert not columnar.is_current(store, csv_path)
+
+
+@pytest.mark.parametrize('text', ['two\nlines', 'tab\tand, comma'])
+def test_any_text(tmp_path, text):
+    columnar.write_table(pd.DataFrame({'text': [text]}), str(tmp_path / 'table.columns'))
+    assert columnar.read_table(str(tmp_path / 'table.columns'))['text'].tolist()==[text]
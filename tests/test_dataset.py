@@ -0,0 +1,71 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import dataset as dataset_module
+from conftest import NEW_RELEASE, OLD_RELEASE
+from analytics import NA, decile_index
+from changes import decile_numbers
+from dataset import DatasetRegistry, map_categories
+
+
+def _table_bytes(registry, kind, release):
+    return registry._tables[(kind, release)]['nbytes']
+
+
+def test_releases(registry):
+    areas, retailers = registry.releases()
+    assert list(areas)==[OLD_RELEASE, NEW_RELEASE] and len(retailers)==1
+    assert registry.get().releases[0]==NEW_RELEASE
+    with pytest.raises(KeyError):
+        registry.get('Oct1999')
+
+
+def test_tables_are_shared_and_loaded_once(data_dir, monkeypatch):
+    loads = []
+    load_areas = dataset_module.load_areas
+    monkeypatch.setattr(dataset_module, 'load_areas', lambda path: loads.append(path) or load_areas(path))
+    registry = DatasetRegistry(data_dir)
+    with ThreadPoolExecutor(4) as pool:
+        datasets = list(pool.map(lambda _: registry.get(NEW_RELEASE), range(4)))
+    assert len(loads)==1 and all(d is datasets[0] for d in datasets)
+    old = registry.get(OLD_RELEASE)
+    assert old.retailers is datasets[0].retailers
+    assert len(loads)==2
+
+
+def test_eviction_keeps_to_the_budget(data_dir):
+    versions = []
+    registry = DatasetRegistry(data_dir)
+    registry.add_listener(versions.append)
+    new = registry.get(NEW_RELEASE)
+    retailers = new.releases[1]
+    both = (_table_bytes(registry, 'areas', NEW_RELEASE) + _table_bytes(registry, 'retailers', retailers)
+            + _table_bytes(registry, 'areas', NEW_RELEASE))
+    # Room for the tables of both index releases, which have the same areas,
+    # with the retailers counted once
+    registry.max_bytes = both + 1000
+    old = registry.get(OLD_RELEASE)
+    assert versions[-1]=={new.version, old.version}
+
+    # A large derived value of the most recent dataset pushes the other out
+    old.derived('big', lambda d: np.zeros(2000, dtype=np.int64))
+    assert versions[-1]=={old.version}
+    assert set(registry._tables)=={('areas', OLD_RELEASE), ('retailers', retailers)}
+    assert registry.get(OLD_RELEASE) is old
+
+    # The dataset asked for is kept even when over the budget on its own
+    registry.max_bytes = 1
+    assert registry.get(NEW_RELEASE).releases[0]==NEW_RELEASE
+    assert versions[-1]=={registry.get(NEW_RELEASE).version}
+
+
+def test_map_categories():
+    values = pd.Series(pd.Categorical(['2', None, '10', '0', '2'], categories=['0', '10', '2']))
+    assert map_categories(values, ['zero', 'ten', 'two'], 'missing').tolist()==['two', 'missing', 'ten', 'zero', 'two']
+    np.testing.assert_array_equal(decile_numbers(values), [2, np.nan, 10, np.nan, 2])
+    assert decile_index(values).tolist()==[1, NA, 9, NA, 1]
+    missing = pd.Series(pd.Categorical([None, None], categories=[]))
+    assert decile_index(missing).tolist()==[NA, NA]
@@ -0,0 +1,72 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+from flask import Flask
+
+import api
+from changes import change_groups, decile_change
+from conftest import NEW_RELEASE, OLD_RELEASE
+
+
+@pytest.fixture
+def client(registry, monkeypatch):
+    monkeypatch.setattr(api, 'current_dataset', registry.get)
+    server = Flask(__name__)
+    server.register_blueprint(api.api)
+    return server.test_client()
+
+
+def _csv(response):
+    assert response.status_code==200, response.get_data(as_text=True)
+    return pd.read_csv(io.BytesIO(response.get_data()), dtype={'geo_code': str})
+
+
+def test_export_deciles(client, registry):
+    df = _csv(client.get('/api/export?domain=pp_dec_combined&decile=1&decile=2'))
+    areas = registry.get().areas
+    expected = areas['pp_dec_combined'].astype(str).isin(['1', '2'])
+    assert len(df)==expected.sum()
+    assert set(df['pp_dec_combined'].astype(str))=={'1', '2'}
+
+
+def test_export_compare_changes(client, registry):
+    # The links of a map comparing releases send the change groups shown
+    df = _csv(client.get('/api/export?domain=pp_dec_combined&compare={}&change=-1&change=%2B2'.format(OLD_RELEASE)))
+    dataset, other = registry.get(NEW_RELEASE), registry.get(OLD_RELEASE)
+    groups = np.asarray(change_groups(decile_change(dataset, other)['pp_dec_combined']))
+    expected = dataset.areas['geo_code'][np.isin(groups, ['-1', '+2'])]
+    assert 0 < len(df) < len(dataset.areas)
+    assert df['geo_code'].tolist()==expected.tolist()
+
+
+def test_export_compare_without_changes(client, registry):
+    df = _csv(client.get('/api/export?domain=pp_dec_combined&compare={}'.format(OLD_RELEASE)))
+    assert len(df)==len(registry.get().areas)
+    df = _csv(client.get('/api/export?domain=pp_dec_combined&compare={}&change='.format(OLD_RELEASE)))
+    assert len(df)==0
+
+
+def test_export_change_errors(client):
+    assert client.get('/api/export?change=-1').status_code==400
+    assert client.get('/api/export?compare={}&change=3'.format(OLD_RELEASE)).status_code==400
+    assert client.get('/api/export?compare=Oct1999').status_code==400
+
+
+def test_export_parquet_stream(client, registry, monkeypatch):
+    pq = pytest.importorskip('pyarrow.parquet')
+    import export
+    monkeypatch.setattr(export, 'CHUNK_ROWS', 300)
+    response = client.get('/api/export?format=parquet&domain=pp_dec_combined&decile=1&decile=2&decile=3')
+    assert response.status_code==200
+    # Sent a row group at a time rather than as one body
+    parts = [part for part in response.response if part]
+    assert len(parts) > 2
+    table = pq.read_table(io.BytesIO(b''.join(parts)))
+    expected = _csv(client.get('/api/export?format=csv&domain=pp_dec_combined&decile=1&decile=2&decile=3'))
+    assert table.num_rows==len(expected) > 300
+    assert pq.ParquetFile(io.BytesIO(b''.join(parts))).num_row_groups==-(-len(expected) // 300)
+    df = table.to_pandas()
+    assert df['geo_code'].tolist()==expected['geo_code'].tolist()
+    assert df['pp_dec_combined'].tolist()==expected['pp_dec_combined'].astype(str).tolist()
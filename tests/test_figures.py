@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+
+from figures import MISSING_DECILE, build_figure, decile_groups, regroup_update
+
+
+def _areas():
+    deciles = pd.Categorical(['1', '3', np.nan, '0', '3', np.nan], categories=['0', '1', '2', '3'])
+    return pd.DataFrame({'geo_code': ['E0{}'.format(i) for i in range(6)],
+                         'geo_label': ['Area {}'.format(i) for i in range(6)],
+                         'latitude': np.linspace(53, 54, 6),
+                         'longitude': np.linspace(-2, -1, 6),
+                         'pp_dec_combined': deciles})
+
+
+def test_decile_groups_missing_decile():
+    groups, codes = decile_groups(_areas()['pp_dec_combined'])
+    assert [g['name'] for g in groups]==['1', '3', MISSING_DECILE, '0']
+    assert [g.get('visible') for g in groups]==[None, 'legendonly', False, None]
+    assert codes.tolist()==[0, 1, 2, 3, 1, 2]
+
+
+def test_build_figure_matches_groups():
+    areas = _areas()
+    fig = build_figure(areas, None, 'pp_dec_combined', False)
+    groups, codes = decile_groups(areas['pp_dec_combined'])
+    # Every area is on the map, in the traces decile_groups puts it in
+    assert [trace.name for trace in fig.data]==[g['name'] for g in groups]
+    assert [trace.visible for trace in fig.data]==[g.get('visible') for g in groups]
+    for i, trace in enumerate(fig.data):
+        assert sorted(row[-1] for row in trace.customdata)==np.flatnonzero(codes==i).tolist()
+    assert regroup_update(areas, 'pp_dec_combined')['codes']=='012312'
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+
+from retailer_filter import GROUP_PREFIX, RetailerMasks, filtered_retailers
+
+
+def _expected(dataset, names=None, sizes=None):
+    keep = np.ones(len(dataset.retailers), dtype=bool)
+    if names is not None:
+        keep &= dataset.retailers['retailer'].astype(str).isin(names).to_numpy()
+    if sizes is not None:
+        keep &= dataset.retailers['size_code'].astype(str).isin(sizes).to_numpy()
+    return np.flatnonzero(keep).tolist()
+
+
+def test_rows(registry):
+    dataset = registry.get()
+    masks = RetailerMasks(dataset)
+    assert masks.rows().tolist()==list(range(len(dataset.retailers)))
+    assert masks.rows(['Tesco']).tolist()==_expected(dataset, ['Tesco'])
+    assert masks.rows(sizes=['Large']).tolist()==_expected(dataset, sizes=['Large'])
+    assert (masks.rows([GROUP_PREFIX + 'Discounters', 'Spar'], ['Large', 'Very large']).tolist()==
+            _expected(dataset, ['Aldi', 'Lidl', 'Spar'], ['Large', 'Very large']))
+
+
+def test_picks_with_no_stores_show_none(registry):
+    dataset = registry.get()
+    masks = RetailerMasks(dataset)
+    # A group with none of its members in the release, and one unknown to it
+    masks.groups['Empty'] = []
+    assert len(masks.rows([GROUP_PREFIX + 'Empty']))==0
+    assert len(masks.rows([GROUP_PREFIX + 'Unknown']))==0
+    assert len(masks.rows(['Not a retailer']))==0
+    assert len(masks.rows(sizes=['Not a size']))==0
+
+
+def test_filtered_retailers_keeps_labels(registry):
+    dataset = registry.get()
+    stores = filtered_retailers(dataset, ['Tesco'], ['Large'])
+    assert isinstance(stores, pd.DataFrame)
+    assert stores.index.tolist()==dataset.retailers.index[_expected(dataset, ['Tesco'], ['Large'])].tolist()
@@ -0,0 +1,64 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+from regions import area_countries
+from search import AreaSearch, PrefixIndex, first_kept, search_areas
+
+
+def test_rows_with_prefix():
+    keys = ['leeds 001a', 'leeds 002b', 'leicester 001a', 'lee', 'ynys môn 001a', 'london', '']
+    index = PrefixIndex(keys, np.arange(len(keys)))
+    # Every prefix of every key, and some matching nothing
+    prefixes = {key[:n] for key in keys for n in range(len(key) + 1)} | {'leeds 001ab', 'x', 'ynys mon'}
+    for prefix in prefixes:
+        expected = [row for row, key in enumerate(keys) if key.startswith(prefix)]
+        assert sorted(index.rows_with_prefix(prefix).tolist())==expected, prefix
+
+
+def test_rows_with_prefix_longer_than_keys():
+    index = PrefixIndex(['ab', 'abc'], [0, 1])
+    assert index.rows_with_prefix('abc').tolist()==[1]
+    assert index.rows_with_prefix('abcd').tolist()==[]
+
+
+def test_first_kept():
+    rows = np.arange(100)
+    assert first_kept(rows, lambda chunk: chunk % 7==0, 5).tolist()==[0, 7, 14, 21, 28]
+    assert first_kept(rows, lambda chunk: chunk > 95, 10).tolist()==[96, 97, 98, 99]
+    assert first_kept(rows[:0], lambda chunk: chunk > 0, 5).tolist()==[]
+
+
+def test_search(registry):
+    dataset = registry.get()
+    areas = dataset.areas
+    search = AreaSearch(dataset)
+    code = areas['geo_code'].iloc[123]
+    assert search.search(code.lower()).tolist()[0]==123
+
+    # Labels are found from the start of any of their words, ignoring case and spacing
+    label = areas['geo_label'].iloc[45]
+    words = label.split()
+    rows = search.search('  ' + '   '.join(words[1:]).upper(), limit=len(areas))
+    assert 45 in rows.tolist()
+    labels = areas['geo_label'].to_numpy()[rows]
+    assert all(' '.join(words[1:]).lower() in value.lower() for value in labels)
+    assert search.search('   ').tolist()==[]
+
+
+def test_search_region(registry):
+    dataset = registry.get()
+    countries = area_countries(dataset.areas['geo_code'])
+    scottish = np.flatnonzero(countries=='S')
+    rows = search_areas(dataset, dataset.areas['geo_label'].iloc[scottish[0]].split()[0], region='S', limit=1000)
+    assert scottish[0] in rows.tolist() and (countries[rows]=='S').all()
+    assert search_areas(dataset, 'e01', region='S').tolist()==[]
+    assert len(search_areas(dataset, 'e01', limit=3))==3
+
+
+def test_missing_labels_are_not_found():
+    areas = pd.DataFrame({'geo_code': ['E01000001', 'E01000002'], 'geo_label': ['Leeds 001A', np.nan]})
+    search = AreaSearch(SimpleNamespace(areas=areas))
+    assert search.search('nan').tolist()==[]
+    assert search.search('e01').tolist()==[0, 1]
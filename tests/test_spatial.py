@@ -0,0 +1,69 @@
+import numpy as np
+
+from dataset import Dataset
+from nearby import nearby_records
+from spatial import EARTH_RADIUS_KM, LARGE_SIZES, PointGrid, StoreIndex
+
+
+def _points(n=5000, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(50, 58, n), rng.uniform(-6, 1, n)
+
+
+def test_grid_query_and_count():
+    lat, lon = _points()
+    grid = PointGrid(lat, lon, 0.25)
+    rng = np.random.default_rng(1)
+    for _ in range(50):
+        south, north = np.sort(rng.uniform(49, 59, 2))
+        west, east = np.sort(rng.uniform(-7, 2, 2))
+        expected = np.flatnonzero((lat >= south) & (lat <= north) & (lon >= west) & (lon <= east))
+        assert grid.query(south, west, north, east).tolist()==expected.tolist()
+        least, most = grid.count(south, west, north, east)
+        assert least <= len(expected) <= most
+
+
+def _haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2)**2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def test_store_index_against_brute_force():
+    lat, lon = _points(2000)
+    sizes = np.random.default_rng(2).choice(['Small convenience', 'Mid-size', 'Large', 'Very large'], len(lat))
+    index = StoreIndex(lat, lon, sizes)
+    query_lat, query_lon = _points(50, seed=3)
+    distances = _haversine_km(query_lat[:, None], query_lon[:, None], lat[None, :], lon[None, :])
+
+    km, rows = index.nearest(query_lat, query_lon, k=5)
+    assert km.shape==rows.shape==(50, 5)
+    np.testing.assert_allclose(km, np.sort(distances, axis=1)[:, :5], rtol=1e-6)
+    np.testing.assert_allclose(distances[np.arange(50)[:, None], rows], km, rtol=1e-6)
+
+    within = index.count_within(query_lat, query_lon, 20)
+    for size, counts in within.items():
+        assert counts.tolist()==((distances <= 20) & (sizes==size)).sum(axis=1).tolist()
+
+    large_km, large_rows = index.nearest_large(query_lat, query_lon)
+    large = np.isin(sizes, LARGE_SIZES)
+    np.testing.assert_allclose(large_km, np.where(large, distances, np.inf).min(axis=1), rtol=1e-6)
+    assert large[large_rows].all()
+
+
+def test_store_index_without_stores():
+    index = StoreIndex(np.empty(0), np.empty(0), np.empty(0, dtype=str))
+    km, rows = index.nearest([53.8, 51.5], [-1.5, -0.1], k=5)
+    assert km.shape==rows.shape==(2, 0)
+    assert index.count_within([53.8, 51.5], [-1.5, -0.1], 1)=={}
+    large_km, large_rows = index.nearest_large([53.8, 51.5], [-1.5, -0.1])
+    assert np.isinf(large_km).all() and (large_rows==-1).all()
+
+
+def test_nearby_records_without_stores(registry):
+    dataset = registry.get()
+    empty = Dataset(dataset.areas, dataset.retailers.iloc[:0], 'empty')
+    result, = nearby_records(empty, [{'lat': 53.8, 'lon': -1.55}], k=3, radius_km=1)
+    assert result['nearest_stores']==[]
+    assert result['stores_within_radius']=={'total': 0}
+    assert result['nearest_large_store_km'] is None
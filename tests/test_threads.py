@@ -0,0 +1,46 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pandas as pd
+
+from cache import TileCache
+from dataset import Dataset
+
+
+def test_derived_is_built_once():
+    dataset = Dataset(pd.DataFrame({'a': [1]}), pd.DataFrame({'b': [2]}), 'v1')
+    builds = []
+
+    def build(dataset):
+        builds.append(threading.get_ident())
+        time.sleep(0.05)
+        return list(range(100))
+
+    with ThreadPoolExecutor(8) as pool:
+        values = list(pool.map(lambda _: dataset.derived('values', build), range(8)))
+    assert len(builds)==1
+    assert all(value is values[0] for value in values)
+    assert dataset.derived_nbytes > 0
+
+
+def test_tiles_of_an_old_version_are_not_written(tmp_path):
+    started, release = threading.Event(), threading.Event()
+
+    def build(dataset, layer, *args):
+        if dataset.version=='v1':
+            started.set()
+            release.wait()
+        return b'tile'
+
+    cache = TileCache(build, directory=str(tmp_path))
+    old = threading.Thread(target=cache.get, args=(SimpleNamespace(version='v1'), 'areas', 0, 0, 0))
+    old.start()
+    started.wait()
+    # The data changes while the old tile is being built
+    cache.get(SimpleNamespace(version='v2'), 'areas', 0, 0, 0)
+    release.set()
+    old.join()
+    assert os.listdir(str(tmp_path))==['v2']
@@ -0,0 +1,124 @@
+import numpy as np
+
+from tiles import SNAP, TILE_EXTENT, area_tile, encode_layer, encode_tile, retailer_tile, tile_bounds, tile_coords
+from viewport import area_grid, grid_level
+
+"""
+The tiles are decoded here with a minimal protobuf reader following the
+Mapbox Vector Tile specification, independently of the encoder in tiles.py.
+"""
+
+
+def _varint(data, i):
+    value = shift = 0
+    while True:
+        byte = data[i]
+        value |= (byte & 0x7f) << shift
+        shift += 7
+        i += 1
+        if byte < 0x80:
+            return value, i
+
+
+def _fields(data):
+    # (field number, value) of every field of a message, bytes for length-delimited fields
+    i = 0
+    while i < len(data):
+        key, i = _varint(data, i)
+        field, wire_type = key >> 3, key & 7
+        if wire_type==0:
+            value, i = _varint(data, i)
+        elif wire_type==2:
+            length, i = _varint(data, i)
+            value, i = data[i:i + length], i + length
+        else:
+            raise ValueError('Unexpected wire type {}'.format(wire_type))
+        yield field, value
+
+
+def _packed(data):
+    values, i = [], 0
+    while i < len(data):
+        value, i = _varint(data, i)
+        values.append(value)
+    return values
+
+
+def _unzigzag(value):
+    return (value >> 1) ^ -(value & 1)
+
+
+def decode_tile(data):
+    layers = {}
+    for field, layer_data in _fields(data):
+        assert field==3
+        layer = {'features': [], 'keys': [], 'values': []}
+        for field, value in _fields(layer_data):
+            if field==1:
+                layer['name'] = value.decode()
+            elif field==2:
+                layer['features'].append(dict(_fields(value)))
+            elif field==3:
+                layer['keys'].append(value.decode())
+            elif field==4:
+                layer['values'].append(dict(_fields(value))[1].decode())
+            elif field==5:
+                layer['extent'] = value
+            elif field==15:
+                layer['version'] = value
+
+        features = []
+        for feature in layer['features']:
+            command, x, y = _packed(feature[4])
+            # A single MoveTo to one point
+            assert command==(1 | 1 << 3)
+            tags = _packed(feature.get(2, b''))
+            features.append({'id': feature[1], 'type': feature[3], 'point': (_unzigzag(x), _unzigzag(y)),
+                             'properties': {layer['keys'][k]: layer['values'][v] for k, v in zip(tags[::2], tags[1::2])}})
+        layers[layer['name']] = dict(layer, features=features)
+    return layers
+
+
+def test_encode_layer_round_trip():
+    ids = np.array([0, 7, 300000])
+    x, y = np.array([0, -64, 4100]), np.array([4095, 12, -1])
+    properties = {'retailer': ['Tesco', 'Aldi', 'Tesco'], 'size_code': ['Large', 'Large', 'Mid-size']}
+    layers = decode_tile(encode_tile([encode_layer('retailers', ids, x, y, properties),
+                                      encode_layer('1', np.array([5]), np.array([1]), np.array([2]))]))
+
+    assert list(layers)==['retailers', '1']
+    layer = layers['retailers']
+    assert layer['version']==2 and layer['extent']==TILE_EXTENT
+    # Repeated values are stored once
+    assert layer['values']==['Tesco', 'Aldi', 'Large', 'Mid-size']
+    assert [f['id'] for f in layer['features']]==[0, 7, 300000]
+    assert all(f['type']==1 for f in layer['features'])
+    assert [f['point'] for f in layer['features']]==[(0, 4095), (-64, 12), (4100, -1)]
+    assert [f['properties'] for f in layer['features']]==[dict(zip(properties, values))
+                                                          for values in zip(*properties.values())]
+    assert layers['1']['features']==[{'id': 5, 'type': 1, 'point': (1, 2), 'properties': {}}]
+
+
+def test_built_tiles(registry):
+    dataset = registry.get()
+    z, x, y = 8, 126, 83
+    layers = decode_tile(retailer_tile(dataset, z, x, y))
+    features = layers['retailers']['features']
+    assert features
+    rows = np.array([f['id'] for f in features])
+    stores = dataset.retailers.iloc[rows]
+    assert [f['properties'] for f in features]==[{'retailer': r, 'size_code': s} for r, s in
+                                                  zip(stores['retailer'].astype(str), stores['size_code'].astype(str))]
+    px, py = tile_coords(stores['lat_wgs'], stores['long_wgs'], z, x, y)
+    assert [f['point'] for f in features]==list(zip(px.tolist(), py.tolist()))
+    assert all(-TILE_EXTENT < p < 2 * TILE_EXTENT and p % SNAP==0 for f in features for p in f['point'])
+
+    # Each area is in the layer of its decile, up to areas on the same pixel
+    layers = decode_tile(area_tile(dataset, 'pp_dec_combined', z, x, y))
+    deciles = dataset.areas['pp_dec_combined'].astype(str).to_numpy()
+    for name, layer in layers.items():
+        assert all(deciles[f['id']]==name for f in layer['features'])
+    grid = area_grid(dataset, grid_level(z))
+    in_tile = grid.query(*tile_bounds(z, x, y))
+    shown = {f['id'] for layer in layers.values() for f in layer['features']}
+    assert shown <= set(in_tile.tolist()) and len(shown) > 0
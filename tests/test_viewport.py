@@ -0,0 +1,23 @@
+import pytest
+
+from figures import CENTER, MAP_SIZE, TILE_SIZE, ZOOM, view_bounds
+from viewport import CELL_PIXELS, cell_size, viewport_bounds
+
+
+def test_viewport_bounds_without_corners():
+    south, west, north, east, zoom = viewport_bounds({'mapbox.center': CENTER, 'mapbox.zoom': ZOOM})
+    assert zoom==ZOOM
+    # The view spans the map's width in pixels at TILE_SIZE pixels per 360 / 2**zoom degrees
+    assert east - west==pytest.approx(360 / 2**ZOOM * MAP_SIZE['width'] / TILE_SIZE)
+    assert (west + east) / 2==pytest.approx(CENTER['lon'])
+    assert south < CENTER['lat'] < north
+
+
+def test_viewport_bounds_from_corners():
+    corners = [[-2, 54], [-1, 54], [-1, 53], [-2, 53]]
+    assert viewport_bounds({'mapbox.zoom': 9, 'mapbox._derived': {'coordinates': corners}})==(53, -2, 54, -1, 9)
+
+
+def test_cells_are_cell_pixels_wide():
+    south, west, north, east = view_bounds(CENTER, 9, MAP_SIZE['width'], MAP_SIZE['height'])
+    assert MAP_SIZE['width'] * cell_size(9) / (east - west)==pytest.approx(CELL_PIXELS)
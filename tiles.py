@@ -0,0 +1,193 @@
+import gzip
+import math
+import os
+
+import numpy as np
+from flask import Blueprint, Response, abort, request
+
+from cache import TileCache
+from dataset import DECILE_COLUMNS, current_dataset
+from figures import decile_groups
+from viewport import area_grid, grid_level, retailer_grid
+
+"""
+Mapbox Vector Tiles of the area centroids and retailer points, served by the
+Flask server at /tiles/areas/<domain>/{z}/{x}/{y}.pbf and
+/tiles/retailers/{z}/{x}/{y}.pbf. Area tiles have one layer per decile of the
+domain, named after it, so the map can draw each decile in its own colour;
+retailer tiles have a single 'retailers' layer with the retailer and size code
+of each store. Feature ids are rows of the areas or retailers table. The
+protobuf encoding is written out here rather than adding a dependency, as only
+point features are needed.
+"""
+
+TILE_EXTENT = 4096
+
+# Points this far outside a tile (in tile units) are included, so that the
+# circles drawn for points near an edge are not cut off
+TILE_BUFFER = 64
+
+# Points in the same layer falling on the same pixel of a 512 pixel tile are
+# sent once, which thins out the tiles at low zoom without visible change
+SNAP = TILE_EXTENT // 512
+
+MAX_ZOOM = 22
+
+TILE_MAX_AGE = int(os.getenv('TILE_MAX_AGE', '86400'))
+
+
+def _varint(value):
+    out = bytearray()
+    while value > 0x7f:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _zigzag(value):
+    return value << 1 if value >= 0 else (-value << 1) - 1
+
+
+def _message(field, data):
+    # Length-delimited field (wire type 2)
+    return _varint(field << 3 | 2) + _varint(len(data)) + data
+
+
+def encode_layer(name, ids, x, y, properties=None):
+    """
+    Layer message of point features at tile coordinates x, y. properties maps
+    each property name to its (string) value for every feature.
+    """
+    properties = properties or {}
+    keys = list(properties)
+    values = []
+    value_index = {}
+    tags = [[] for _ in ids]
+    for k, key in enumerate(keys):
+        for i, value in enumerate(properties[key]):
+            if value not in value_index:
+                value_index[value] = len(values)
+                values.append(value)
+            tags[i] += [k, value_index[value]]
+
+    features = []
+    for i, (feature_id, px, py) in enumerate(zip(ids.tolist(), x.tolist(), y.tolist())):
+        # A single MoveTo command (id 1, count 1) to the point
+        geometry = b'\x09' + _varint(_zigzag(px)) + _varint(_zigzag(py))
+        feature = b'\x08' + _varint(feature_id) + b'\x18\x01' + _message(4, geometry)
+        if tags[i]:
+            feature += _message(2, b''.join(_varint(tag) for tag in tags[i]))
+        features.append(_message(2, feature))
+
+    return (b'\x78\x02' + _message(1, name.encode()) + b''.join(features)
+            + b''.join(_message(3, key.encode()) for key in keys)
+            + b''.join(_message(4, _message(1, str(value).encode())) for value in values)
+            + b'\x28' + _varint(TILE_EXTENT))
+
+
+def encode_tile(layers):
+    return b''.join(_message(3, layer) for layer in layers)
+
+
+def _lat(y):
+    return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y))))
+
+
+def tile_bounds(z, x, y, buffer=TILE_BUFFER):
+    """(south, west, north, east) of a tile, extended by buffer tile units."""
+    n = 2**z
+    pad = buffer / TILE_EXTENT
+    return (_lat(min((y + 1 + pad) / n, 1)), (x - pad) / n * 360 - 180,
+            _lat(max((y - pad) / n, 0)), (x + 1 + pad) / n * 360 - 180)
+
+
+def tile_coords(lat, lon, z, x, y):
+    # Web Mercator position of the points in tile units, snapped to SNAP
+    n = 2**z
+    lat = np.radians(np.clip(np.asarray(lat, dtype=np.float64), -85.0511, 85.0511))
+    px = (np.asarray(lon, dtype=np.float64) + 180) / 360 * n - x
+    py = (1 - np.log(np.tan(lat) + 1 / np.cos(lat)) / np.pi) / 2 * n - y
+    return (np.floor(px * TILE_EXTENT / SNAP).astype(np.int64) * SNAP,
+            np.floor(py * TILE_EXTENT / SNAP).astype(np.int64) * SNAP)
+
+
+def _distinct(rows, x, y):
+    # First of the points at each position
+    _, first = np.unique(np.stack([x, y]), axis=1, return_index=True)
+    first = np.sort(first)
+    return rows[first], x[first], y[first]
+
+
+def _domain_groups(dataset, domain):
+    return dataset.derived(('decile_groups', domain), lambda d: decile_groups(d.areas[domain]))
+
+
+def area_tile(dataset, domain, z, x, y):
+    groups, codes = _domain_groups(dataset, domain)
+    grid = area_grid(dataset, grid_level(z))
+    rows = grid.query(*tile_bounds(z, x, y))
+    layers = []
+    for code, group in enumerate(groups):
+        group_rows = rows[codes[rows]==code]
+        if len(group_rows):
+            px, py = tile_coords(grid.lat[group_rows], grid.lon[group_rows], z, x, y)
+            layers.append(encode_layer(group['name'], *_distinct(group_rows, px, py)))
+    return encode_tile(layers)
+
+
+def retailer_tile(dataset, z, x, y):
+    grid = retailer_grid(dataset, grid_level(z))
+    rows = grid.query(*tile_bounds(z, x, y))
+    if not len(rows):
+        return encode_tile([])
+    rows, px, py = _distinct(rows, *tile_coords(grid.lat[rows], grid.lon[rows], z, x, y))
+    retailers = dataset.retailers
+    properties = {column: np.asarray(retailers[column].to_numpy()[rows], dtype=str).tolist()
+                  for column in ('retailer', 'size_code')}
+    return encode_tile([encode_layer('retailers', rows, px, py, properties)])
+
+
+def build_tile(dataset, layer, domain, z, x, y):
+    if layer=='areas':
+        return area_tile(dataset, domain, z, x, y)
+    return retailer_tile(dataset, z, x, y)
+
+
+tile_cache = TileCache(build_tile,
+                       max_bytes=int(os.getenv('TILE_CACHE_MAX_MB', '64')) * 2**20,
+                       directory=os.getenv('TILE_CACHE_DIR') or None)
+
+tiles = Blueprint('tiles', __name__, url_prefix='/tiles')
+
+
+def tile_response(layer, domain, z, x, y):
+    if not (0 <= z <= MAX_ZOOM and 0 <= x < 2**z and 0 <= y < 2**z):
+        abort(404)
+    dataset = current_dataset()
+    payload = tile_cache.get(dataset, layer, domain, z, x, y)
+
+    # Tiles are cached gzip-compressed, which every browser accepts
+    compressed = 'gzip' in request.accept_encodings
+    response = Response(payload if compressed else gzip.decompress(payload),
+                        mimetype='application/vnd.mapbox-vector-tile')
+    if compressed:
+        response.content_encoding = 'gzip'
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.max_age = TILE_MAX_AGE
+    response.set_etag('{}-{}-{}-{}-{}-{}{}'.format(dataset.version, layer, domain, z, x, y,
+                                                   '-gz' if compressed else ''))
+    return response.make_conditional(request)
+
+
+@tiles.route('/areas/<domain>/<int:z>/<int:x>/<int:y>.pbf')
+def area_tiles(domain, z, x, y):
+    if domain not in DECILE_COLUMNS:
+        abort(404)
+    return tile_response('areas', domain, z, x, y)
+
+
+@tiles.route('/retailers/<int:z>/<int:x>/<int:y>.pbf')
+def retailer_tiles(z, x, y):
+    return tile_response('retailers', '', z, x, y)
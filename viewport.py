@@ -0,0 +1,162 @@
+import numpy as np
+import plotly.graph_objects as go
+
+from figures import (CENTER, MAP_SIZE, TILE_SIZE, ZOOM, build_figure, decile_groups, retailer_trace, style_layout,
+                     view_bounds)
+from spatial import PointGrid
+
+"""
+Viewport-aware map: instead of every point at every zoom level, the map shows
+grid cells summarising the areas (and retailers) at low zoom and only the raw
+points inside the viewport once few enough of them are in view.
+"""
+
+# Grid cells are sized to roughly this many screen pixels at each zoom level
+CELL_PIXELS = 32
+MIN_LEVEL = 3
+MAX_LEVEL = 12
+
+# Raw points are sent once no more than this many of them are in view
+MAX_RAW_POINTS = 5000
+
+# View used until the browser has reported its own
+DEFAULT_ZOOM = ZOOM
+DEFAULT_SIZE = MAP_SIZE
+
+
+def cell_size(level):
+    # A map tile of TILE_SIZE pixels spans 360 / 2**zoom degrees of longitude
+    return 360 / 2**level * CELL_PIXELS / TILE_SIZE
+
+
+def viewport_bounds(relayout_data):
+    """
+    Returns (south, west, north, east, zoom) of the map view reported in the
+    graph's relayoutData, estimated from the centre and zoom if the corners
+    are not included.
+    """
+    relayout_data = relayout_data or {}
+    center = relayout_data.get('mapbox.center', CENTER)
+    zoom = relayout_data.get('mapbox.zoom', DEFAULT_ZOOM)
+    corners = relayout_data.get('mapbox._derived', {}).get('coordinates')
+    if corners:
+        lons, lats = zip(*corners)
+        return min(lats), min(lons), max(lats), max(lons), zoom
+
+    south, west, north, east = view_bounds(center, zoom, DEFAULT_SIZE['width'], DEFAULT_SIZE['height'])
+    return south, west, north, east, zoom
+
+
+def grid_level(zoom):
+    return int(np.clip(np.floor(zoom), MIN_LEVEL, MAX_LEVEL))
+
+
+def area_grid(dataset, level):
+    return dataset.derived(('area_grid', level),
+                           lambda d: PointGrid(d.areas['latitude'], d.areas['longitude'], cell_size(level)))
+
+
+def retailer_grid(dataset, level):
+    return dataset.derived(('retailer_grid', level),
+                           lambda d: PointGrid(d.retailers['lat_wgs'], d.retailers['long_wgs'], cell_size(level)))
+
+
+def area_aggregates(dataset, domain, level):
+    # Count of areas in each decile for every grid cell, with the highest
+    # priority decile found in the cell
+    def build(dataset):
+        groups, codes = decile_groups(dataset.areas[domain])
+        lat, lon, counts = area_grid(dataset, level).aggregate(codes, len(groups))
+        worst = np.argmax(counts > 0, axis=1)
+        return groups, lat, lon, counts, worst
+    return dataset.derived(('area_aggregates', domain, level), build)
+
+
+def retailer_aggregates(dataset, level):
+    def build(dataset):
+        grid = retailer_grid(dataset, level)
+        lat, lon, counts = grid.aggregate(np.zeros(len(grid.lat), dtype=np.int64), 1)
+        return lat, lon, counts[:, 0]
+    return dataset.derived(('retailer_aggregates', level), build)
+
+
+def marker_sizes(counts, largest):
+    # Marker area proportional to the number of points in the cell
+    return 6 + 14 * np.sqrt(counts / max(largest, 1))
+
+
+def area_cell_traces(dataset, domain, level, bounds):
+    groups, lat, lon, counts, worst = area_aggregates(dataset, domain, level)
+    cells = area_grid(dataset, level).query_cells(*bounds)
+    totals = counts.sum(axis=1)
+
+    traces = []
+    for i, group in enumerate(groups):
+        in_group = cells[worst[cells]==i]
+        hover = ['<b>{} areas</b><br>'.format(total) +
+                 '<br>'.join('Decile {}: {}'.format(g['name'], n) for g, n in zip(groups, row) if n)
+                 for total, row in zip(totals[in_group], counts[in_group])]
+        traces.append(go.Scattermapbox(lat=lat[in_group],
+                                       lon=lon[in_group],
+                                       marker={'color': group['color'], 'size': marker_sizes(totals[in_group], totals.max())},
+                                       hovertext=hover,
+                                       hoverinfo='text',
+                                       legendgroup=group['name'],
+                                       mode='markers',
+                                       name=group['name'],
+                                       showlegend=True,
+                                       subplot='mapbox',
+                                       visible=group.get('visible', True)))
+    return traces
+
+
+def retailer_cell_trace(dataset, level, bounds):
+    lat, lon, counts = retailer_aggregates(dataset, level)
+    cells = retailer_grid(dataset, level).query_cells(*bounds)
+    return go.Scattermapbox(lat=lat[cells],
+                            lon=lon[cells],
+                            marker={'color': '#808080', 'opacity': 0.4, 'size': marker_sizes(counts[cells], counts.max())},
+                            hovertext=['{} stores'.format(n) for n in counts[cells]],
+                            hoverinfo='text',
+                            meta='retailers',
+                            mode='markers',
+                            name='',
+                            showlegend=False,
+                            subplot='mapbox')
+
+
+def points_in_view(grid, bounds):
+    # Rows of the points in view if there are at most MAX_RAW_POINTS of them,
+    # else None. The cell counts settle most views without a query of the
+    # points, which is only made when they are close to the limit
+    least, most = grid.count(*bounds)
+    if least > MAX_RAW_POINTS:
+        return None
+    rows = grid.query(*bounds)
+    return rows if len(rows) <= MAX_RAW_POINTS else None
+
+
+def viewport_figure(dataset, domain, show_retailers, relayout_data):
+    south, west, north, east, zoom = viewport_bounds(relayout_data)
+    bounds = (south, west, north, east)
+    level = grid_level(zoom)
+
+    rows = points_in_view(area_grid(dataset, level), bounds)
+    if rows is not None:
+        fig = build_figure(dataset.areas.iloc[rows], None, domain, False)
+    else:
+        fig = go.Figure(area_cell_traces(dataset, domain, level, bounds))
+        style_layout(fig)
+
+    if show_retailers:
+        stores = points_in_view(retailer_grid(dataset, level), bounds)
+        if stores is not None:
+            fig.add_trace(retailer_trace(dataset.retailers.iloc[stores]))
+        else:
+            fig.add_trace(retailer_cell_trace(dataset, level, bounds))
+
+    # Keep the user's view when the figure is replaced as they pan and zoom
+    fig.update_layout(mapbox_center=(relayout_data or {}).get('mapbox.center', CENTER),
+                      mapbox_zoom=zoom,
+                      uirevision='viewport')
+    return fig